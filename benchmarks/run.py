@@ -0,0 +1,222 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+from pptx import Presentation
+from pptx.util import Inches
+from benchmarks.synthetic import SyntheticData
+from data.server import Server, data_server
+from graphics.render import figure_to_buffer
+from slides.concept_slide.concept_slide_generator import ConceptSlideGenerator
+from slides.cua_slide.engagement_calendar import CalendarPlotter
+from slides.cua_slide.map import MapPlotter
+from slides.ie_slide.ie_calendar import InformationEnvironmentGenerator
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class StageTimer:
+    # Wall-clock seconds per named stage of one benchmark run
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+
+class Workspace:
+    # Synthetic CSVs for one row count, written once and read back by every benchmark's load stage
+    def __init__(self, data, directory):
+        self.data = data
+        self.directory = directory
+        self.paths = {}
+        for name, frame in data.frames().items():
+            self.paths[name] = os.path.join(directory, f'{name}.csv')
+            frame.to_csv(self.paths[name], index=False)
+        self.image = os.path.join(directory, 'img.png')
+        plt.imsave(self.image, data.rng.random((60, 90)))
+
+    def read(self, name):
+        # Parse the CSV the way the data server does and hand it to the shared server
+        frame = Server.get_dataset(name).read(self.paths[name])
+        setattr(data_server, name, frame)
+        return frame
+
+
+def save_pptx(add_content):
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[5])
+    add_content(slide)
+    prs.save(io.BytesIO())
+
+
+def bench_calendar(workspace, timer):
+    with timer.stage('load'):
+        plotter = CalendarPlotter(30, engagements=workspace.read('engagements'), start_date=workspace.data.start)
+    with timer.stage('placement'):
+        placement = plotter.place_engagements()
+    with timer.stage('draw'):
+        plotter.draw_frame()
+        plotter.plot_engagements(placement)
+    with timer.stage('savefig'):
+        image = plotter.render()
+    with timer.stage('pptx'):
+        save_pptx(lambda slide: slide.shapes.add_picture(image, 0, 0, Inches(5), Inches(5)))
+    with timer.stage('native_pptx'):
+        save_pptx(lambda slide: plotter.draw_pptx(slide, 0, 0, Inches(5), Inches(5)))
+
+
+def bench_map(workspace, timer):
+    MapPlotter.get_basemap().load()  # the shared basemap raster is rendered once per machine, not per run
+    with timer.stage('load'):
+        workspace.read('bases')
+        plotter = MapPlotter(engagements=workspace.read('engagements'))
+    with timer.stage('placement'):
+        placement = plotter.place_pucks()
+    with timer.stage('draw'):
+        fig = plotter.draw_map(placement=placement)
+    with timer.stage('savefig'):
+        image = figure_to_buffer(fig)
+    with timer.stage('pptx'):
+        save_pptx(lambda slide: slide.shapes.add_picture(image, 0, 0, Inches(5), Inches(6)))
+    with timer.stage('native_pptx'):
+        save_pptx(lambda slide: plotter.draw_pptx(slide, 0, 0, Inches(5), Inches(6)))
+
+
+def bench_ie(workspace, timer):
+    generator = InformationEnvironmentGenerator()
+    generator.today = workspace.data.start.to_pydatetime()
+    start_date, end_date = generator.get_window()
+    with timer.stage('load'):
+        workspace.read('engagements90')
+        engagements = generator.filter_engagements(start_date, end_date)
+    with timer.stage('placement'), warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # lane overflow is expected at large row counts
+        placement = generator.place_engagements(engagements, start_date, end_date)
+    with timer.stage('draw'):
+        fig = generator.draw_chart(engagements, placement)
+    with timer.stage('savefig'):
+        image = figure_to_buffer(fig)
+    with timer.stage('pptx'):
+        save_pptx(lambda slide: slide.shapes.add_picture(image, 0, 0, Inches(10), Inches(5.3)))
+
+
+def bench_concept(workspace, timer):
+    output = os.path.join(workspace.directory, 'concept.pptx')
+    generator = ConceptSlideGenerator(output_ppt=output, image=workspace.image)
+    with timer.stage('load'):
+        workspace.read('sample_engagements')
+    with timer.stage('pptx'):
+        generator.generate_streaming()
+
+
+# Largest row count each benchmark runs at by default; every engagement becomes an artist, shape or slide
+BENCHMARKS = {
+    'calendar': (bench_calendar, 10000),
+    'map': (bench_map, 1000000),
+    'ie': (bench_ie, 10000),
+    'concept': (bench_concept, 2000),
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, names=None, repeat=1, max_rows=None, seed=0):
+    # Best of `repeat` runs per stage, for every benchmark at every row count it supports
+    results, skipped = [], []
+    original = {name: data_server.cache.get(name) for name in Server.dataset_names()}
+    try:
+        for rows in sizes:
+            with tempfile.TemporaryDirectory() as directory:
+                workspace = Workspace(SyntheticData(rows, seed=seed), directory)
+                for name in names or BENCHMARKS:
+                    bench, limit = BENCHMARKS[name]
+                    if rows > (max_rows or limit):
+                        skipped.append({'benchmark': name, 'rows': rows})
+                        continue
+                    best = {}
+                    for _ in range(repeat):
+                        timer = StageTimer()
+                        bench(workspace, timer)
+                        plt.close('all')
+                        for stage, seconds in timer.stages.items():
+                            best[stage] = min(best.get(stage, seconds), seconds)
+                    results.append({'benchmark': name, 'rows': rows, 'stages': best, 'total': sum(best.values())})
+                    print(f'{name:>8} {rows:>9} rows  ' + '  '.join(f'{stage} {seconds:.3f}s'
+                                                                   for stage, seconds in best.items()))
+    finally:
+        # Put the real datasets back (or unload them again) for anything else running in this process
+        for name, frame in original.items():
+            if frame is None:
+                data_server.unload(name)
+            else:
+                setattr(data_server, name, frame)
+
+    return {'commit': git_commit(), 'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0], 'platform': platform.platform(), 'repeat': repeat,
+            'results': results, 'skipped': skipped}
+
+
+def compare(baseline, current):
+    # Ratio current / baseline for every stage both reports measured; above 1 is slower
+    def index(report):
+        return {(r['benchmark'], r['rows'], stage): seconds
+                for r in report['results'] for stage, seconds in r['stages'].items()}
+
+    before, after = index(baseline), index(current)
+    rows = [(*key, before[key], after[key], after[key] / before[key] if before[key] else float('nan'))
+            for key in after if key in before]
+    return pd.DataFrame(rows, columns=['benchmark', 'rows', 'stage', 'baseline', 'current', 'ratio'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time every slide generator on synthetic engagement data.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='row counts to generate (10 to 1000000)')
+    parser.add_argument('--benchmark', action='append', choices=list(BENCHMARKS),
+                        help='only run these benchmarks; may be repeated')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per benchmark; the fastest is kept')
+    parser.add_argument('--max-rows', type=int, default=None,
+                        help='override the per-benchmark row limits (e.g. to push the calendar to 1000000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON report (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', default=None, metavar='BASELINE', help='JSON report to compare against')
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.benchmark, args.repeat, args.max_rows, args.seed)
+    output = args.output or os.path.join(RESULTS_DIR, f'{report["commit"] or "worktree"}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report).to_string(index=False, float_format='{:.3f}'.format))
+
+
+if __name__ == '__main__':
+    main()
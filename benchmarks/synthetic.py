@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# Value pools matching the sample CSVs in data/
+CATEGORIES = ['Mil-Mil (US)', 'Mil-Mil (ROK)', 'Civ-Mil']
+COLORS = ['blue', 'green', 'purple', 'orange']
+LINES_OF_EFFORT = ['LOE 1: Readiness', 'LOE 2: Shape the Theater', 'LOE 3: Strengthen the Alliance', 'LOE 4: People']
+KINDS = ['Meeting', 'Inspection', 'Briefing', 'Training', 'Review', 'Exercise']
+IE_CATEGORIES = ['Civilian', 'Military', 'DIV', '8A', 'Higher', 'Holidays']
+UNIFORMS = ['ACU', 'OCP', 'Service Uniform', 'Civilian Attire']
+ANSWERS = ['Yes', 'No']
+
+
+class SyntheticData:
+    # Random but reproducible frames with the schemas of engagements.csv, engagements90.csv,
+    # sample_engagement.csv and bases.csv, at any row count. Dates fall inside the windows the slides show:
+    # four calendar weeks from start for the calendar/map, ninety days for the IE chart
+    def __init__(self, rows, start='2024-06-03', n_bases=50, seed=0):
+        self.rows = rows
+        self.start = pd.Timestamp(start)
+        self.n_bases = n_bases
+        self.rng = np.random.default_rng(seed)
+        # Base locations scattered over the mainland part of the map extent
+        self.base_frame = pd.DataFrame({
+            'name': [f'Base {i}' for i in range(n_bases)],
+            'latitude': self.rng.uniform(34.8, 38.2, n_bases).round(4),
+            'longitude': self.rng.uniform(126.5, 129.2, n_bases).round(4),
+        })
+
+    def choice(self, values, size=None):
+        return np.asarray(values, dtype=object)[self.rng.integers(0, len(values), size or self.rows)]
+
+    def dates(self, days):
+        return self.start + pd.to_timedelta(self.rng.integers(0, days, self.rows), unit='D')
+
+    def bases(self):
+        return self.base_frame.copy()
+
+    def engagement_names(self, locations):
+        return pd.Series(self.choice(KINDS)) + ' at ' + pd.Series(locations)
+
+    def engagements(self):
+        locations = self.choice(self.base_frame['name'])
+        return pd.DataFrame({
+            'date': self.dates(28).strftime('%Y-%m-%d'),
+            'location': locations,
+            'engagement': self.engagement_names(locations),
+            'category': self.choice(CATEGORIES),
+            'loe': self.choice(LINES_OF_EFFORT),
+            'color': self.choice(COLORS),
+        })
+
+    def engagements90(self):
+        locations = self.choice(self.base_frame['name'])
+        return pd.DataFrame({
+            'date': self.dates(90).strftime('%Y-%m-%d'),
+            'location': locations,
+            'category': self.choice(IE_CATEGORIES),
+            'type': self.choice(CATEGORIES),
+            'engagement': self.engagement_names(locations),
+            'status': self.rng.integers(0, 3, self.rows),
+        })
+
+    def sample_engagements(self):
+        locations = self.choice(self.base_frame['name'])
+        return pd.DataFrame({
+            'Event': self.engagement_names(locations),
+            'Date/Time': self.dates(90).strftime('%Y-%m-%d'),
+            'Location': locations,
+            'Line of Effort': self.choice(LINES_OF_EFFORT),
+            'Subordinate Objective': 'Enhance operational readiness',
+            'Purpose': 'To improve interoperability between U.S. and ROK forces',
+            '2ID/RUCD Attendees': 'Colonel Smith',
+            'Relevant Attendees': 'General Lee; Major Park; Lieutenant Kim',
+            'Uniform': self.choice(UNIFORMS),
+            'Messages / Effects': self.choice(['Increase readiness; Build relationships', 'Build relationships',
+                                               'Increase readiness; Build relationships; Share lessons learned']),
+            'Legal Review': self.choice(ANSWERS),
+            'Gift': self.choice(ANSWERS),
+            'PAO Support': self.choice(['All', 'Photo', 'None']),
+            'Inclement Weather': 'None',
+        })
+
+    def frames(self):
+        # Keyed by data server dataset name
+        return {'engagements': self.engagements(), 'engagements90': self.engagements90(),
+                'sample_engagements': self.sample_engagements(), 'bases': self.bases()}
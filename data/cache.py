@@ -0,0 +1,27 @@
+import hashlib
+import json
+import os
+
+# Local cache for derived artifacts (geometry extracts, rendered layers, ...); safe to delete at any time
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+
+def cache_key(*parts):
+    # Stable short hash of any JSON-serialisable key parts
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_path(namespace, key, extension):
+    directory = os.path.join(CACHE_DIR, namespace)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{key}.{extension}')
+
+
+def source_mtime(path):
+    # A shapefile is several sibling files; any of them changing invalidates derived data
+    stem, _ = os.path.splitext(path)
+    mtimes = [os.path.getmtime(stem + ext) for ext in ('.shp', '.shx', '.dbf') if os.path.exists(stem + ext)]
+    if not mtimes:
+        return os.path.getmtime(path)
+    return max(mtimes)
@@ -0,0 +1,146 @@
+import glob
+import json
+import os
+import struct
+from data.cache import cache_key, cache_path, source_mtime
+from data.geometry import GeometryProvider
+from data.server import Server
+
+# Shape type codes of the ESRI shapefile header
+SHAPE_TYPES = {0: 'Null', 1: 'Point', 3: 'PolyLine', 5: 'Polygon', 8: 'MultiPoint', 11: 'PointZ', 13: 'PolyLineZ',
+               15: 'PolygonZ', 18: 'MultiPointZ', 21: 'PointM', 23: 'PolyLineM', 25: 'PolygonM', 28: 'MultiPointM',
+               31: 'MultiPatch'}
+
+
+def read_shp_header(path):
+    # Shape type and bounding box (x0, x1, y0, y1) from the fixed 100 byte header
+    with open(path, 'rb') as f:
+        header = f.read(100)
+    file_code, = struct.unpack('>i', header[:4])
+    if file_code != 9994:
+        raise ValueError(f'{path} is not a shapefile')
+    shape_type, x0, y0, x1, y1 = struct.unpack('<i4d', header[32:68])
+    return SHAPE_TYPES.get(shape_type, str(shape_type)), [x0, x1, y0, y1]
+
+
+def read_shx_count(path):
+    # The index holds one 8 byte record per feature after its 100 byte header; the length is in 16 bit words
+    with open(path, 'rb') as f:
+        file_length, = struct.unpack('>i', f.read(28)[24:28])
+    return (file_length * 2 - 100) // 8
+
+
+def read_dbf_fields(path):
+    # Attribute columns (name, type, length, decimals) from the dBASE field descriptors
+    fields = []
+    with open(path, 'rb') as f:
+        f.seek(32)
+        while True:
+            descriptor = f.read(32)
+            if not descriptor or descriptor[0] == 0x0D:
+                break
+            name = descriptor[:11].split(b'\0', 1)[0].decode('latin-1')
+            fields.append({'name': name, 'type': chr(descriptor[11]), 'length': descriptor[16],
+                           'decimals': descriptor[17]})
+    return fields
+
+
+class Catalog:
+    # Index of the Natural Earth layers in a directory: bounding box, feature count, geometry type and attribute
+    # columns of every shapefile, read from the file headers alone and kept in a small JSON file. Layers are
+    # only rescanned when their files change, and queries only open the layers intersecting an extent
+    def __init__(self, directory='10m_cultural'):
+        self.name = directory
+        self.directory = Server.get_relative_path(directory)
+        self.index_path = cache_path('catalog', cache_key(self.directory), 'json')
+        self.entries = None
+        self.providers = {}
+
+    @staticmethod
+    def layer_name(path):
+        # 'ne_10m_admin_0_disputed_areas.shp' -> 'admin_0_disputed_areas'
+        name = os.path.splitext(os.path.basename(path))[0]
+        return name[len('ne_10m_'):] if name.startswith('ne_10m_') else name
+
+    def scan(self):
+        previous = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                previous = json.load(f)
+
+        entries = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.shp'))):
+            name = self.layer_name(path)
+            mtime = source_mtime(path)
+            if name in previous and previous[name]['mtime'] == mtime:
+                entries[name] = previous[name]
+                continue
+            # Some bundled layers ship without their attribute table; they are indexed with geometry only
+            stem = os.path.splitext(path)[0]
+            geometry_type, bounds = read_shp_header(path)
+            entries[name] = {'file': os.path.basename(path), 'mtime': mtime, 'geometry_type': geometry_type,
+                             'bounds': bounds,
+                             'count': read_shx_count(stem + '.shx') if os.path.exists(stem + '.shx') else None,
+                             'fields': read_dbf_fields(stem + '.dbf') if os.path.exists(stem + '.dbf') else []}
+
+        if entries != previous:
+            with open(self.index_path, 'w') as f:
+                json.dump(entries, f, indent=1)
+        self.entries = entries
+        return entries
+
+    def layers(self, extent=None, geometry_type=None):
+        # Names of the layers whose bounding box intersects extent ([x0, x1, y0, y1]); geometry_type may be
+        # e.g. 'Polygon' or 'PolyLine'
+        if self.entries is None:
+            self.scan()
+        names = []
+        for name, entry in self.entries.items():
+            if geometry_type is not None and entry['geometry_type'] != geometry_type:
+                continue
+            if extent is not None and not self.intersects(entry['bounds'], extent):
+                continue
+            names.append(name)
+        return names
+
+    def describe(self, name):
+        if self.entries is None:
+            self.scan()
+        if name not in self.entries:
+            raise KeyError(f"Unknown layer '{name}'. Available layers: {', '.join(self.entries)}")
+        return self.entries[name]
+
+    @staticmethod
+    def intersects(bounds, extent):
+        x0, x1, y0, y1 = bounds
+        ex0, ex1, ey0, ey1 = extent
+        return x0 <= ex1 and ex0 <= x1 and y0 <= ey1 and ey0 <= y1
+
+    def provider(self, name, columns=()):
+        # Cached extent reader for one layer
+        entry = self.describe(name)
+        columns = list(columns)
+        unknown = set(columns) - {field['name'] for field in entry['fields']}
+        if unknown:
+            raise KeyError(f"Layer '{name}' has no column {', '.join(sorted(unknown))}")
+        key = (name, tuple(columns))
+        if key not in self.providers:
+            self.providers[key] = GeometryProvider(os.path.join(self.name, entry['file']),
+                                                   key_column=columns[0] if columns else None, columns=columns)
+        return self.providers[key]
+
+    def load(self, extent, names=None, columns=(), tolerance=None):
+        # The features intersecting extent, as one GeoDataFrame per layer. Layers outside the extent (or
+        # without any feature inside it) are never opened or are left out
+        frames = {}
+        for name in names or self.layers(extent):
+            if names is not None and not self.intersects(self.describe(name)['bounds'], extent):
+                continue
+            frame = self.provider(name, columns).load(extent, tolerance=tolerance)
+            if len(frame):
+                frames[name] = frame
+        return frames
+
+
+# The bundled Natural Earth cultural layers
+catalog = Catalog()
@@ -0,0 +1,81 @@
+import os
+import pandas as pd
+from data.cache import cache_key, cache_path, source_mtime
+from data.server import Server
+
+
+class GeometryProvider:
+    # Reads only the features inside a map extent (and only the needed columns) from a Natural Earth layer,
+    # keeping a compact WKB copy on disk so later renders skip the shapefile entirely
+    def __init__(self, filename='10m_cultural/ne_10m_admin_0_countries_usa.shp', key_column='ADM0_A3_US',
+                 columns=('ADM0_A3_US',)):
+        self.path = Server.get_relative_path(filename)
+        self.key_column = key_column
+        self.columns = list(columns)
+        self.memory = {}
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def load(self, extent, codes=None, tolerance=None):
+        # extent follows cartopy's [x0, x1, y0, y1] convention. A tolerance (in degrees) gives a simplified copy,
+        # derived from the full-detail features and cached per tolerance
+        codes = sorted(codes) if codes is not None else None
+        key = cache_key(os.path.basename(self.path), source_mtime(self.path), list(extent), self.columns, codes,
+                        tolerance)
+        if key not in self.memory:
+            path = cache_path('geometry', key, 'pkl')
+            if os.path.exists(path):
+                gdf = self.read_cache(path)
+            else:
+                if tolerance:
+                    gdf = self.simplify(self.load(extent, codes), tolerance)
+                else:
+                    gdf = self.read_source(extent, codes)
+                self.write_cache(gdf, path)
+            self.memory[key] = gdf
+        return self.memory[key]
+
+    @staticmethod
+    def simplify(gdf, tolerance):
+        # Topology-preserving, so every polygon stays valid
+        return gdf.set_geometry(gdf.geometry.simplify(tolerance, preserve_topology=True))
+
+    def select(self, gdf, code):
+        return gdf[gdf[self.key_column] == code]
+
+    def read_source(self, extent, codes=None):
+        import geopandas as gpd
+
+        x0, x1, y0, y1 = extent
+        kwargs = {'bbox': (x0, y0, x1, y1)}
+        if codes is not None:
+            kwargs['where'] = f"{self.key_column} IN ({', '.join(repr(code) for code in codes)})"
+        if gpd.options.io_engine == 'pyogrio':
+            kwargs['columns'] = self.columns
+        else:
+            kwargs['include_fields'] = self.columns
+        gdf = gpd.read_file(self.path, **kwargs)
+        return gdf[self.columns + ['geometry']].reset_index(drop=True)
+
+    @staticmethod
+    def write_cache(gdf, path):
+        import shapely
+
+        frame = pd.DataFrame(gdf.drop(columns='geometry'))
+        frame['wkb'] = shapely.to_wkb(gdf.geometry.values)
+        crs = gdf.crs.to_string() if gdf.crs is not None else None
+        pd.to_pickle({'crs': crs, 'frame': frame}, path)
+
+    @staticmethod
+    def read_cache(path):
+        import geopandas as gpd
+        import shapely
+
+        cached = pd.read_pickle(path)
+        frame = cached['frame']
+        geometry = shapely.from_wkb(frame.pop('wkb').values)
+        return gpd.GeoDataFrame(frame, geometry=geometry, crs=cached['crs'])
+
+
+country_geometry = GeometryProvider()
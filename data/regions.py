@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from data.geometry import GeometryProvider
+from instrumentation.tracer import traced, tracer
+
+# Admin-1 regions (provinces, states) of the Natural Earth cultural layers
+province_geometry = GeometryProvider('10m_cultural/ne_10m_admin_1_states_provinces.shp', key_column='adm1_code',
+                                     columns=('adm1_code', 'name', 'admin'))
+
+
+class RegionIndex:
+    # Polygons in an STRtree. All points are located with one bulk query (bounding boxes from the tree, then an
+    # exact test only for the candidates) instead of testing every point against every polygon
+    def __init__(self, regions):
+        import shapely
+
+        self.regions = regions.reset_index(drop=True)
+        self.tree = shapely.STRtree(self.regions.geometry.values)
+
+    @traced('regions.locate')
+    def locate(self, longitude, latitude):
+        # Row of the region containing every point, -1 for points outside all regions (or with NaN coordinates).
+        # A point on a shared border belongs to the first region listed
+        import shapely
+
+        longitude, latitude = np.asarray(longitude, dtype=float), np.asarray(latitude, dtype=float)
+        ids = np.full(len(longitude), -1)
+        valid = np.flatnonzero(~(np.isnan(longitude) | np.isnan(latitude)))
+        points = shapely.points(longitude[valid], latitude[valid])
+        point_index, region_index = self.tree.query(points, predicate='intersects')
+        order = np.lexsort((region_index, point_index))
+        located, first = np.unique(point_index[order], return_index=True)
+        ids[valid[located]] = region_index[order][first]
+        tracer.count('regions.located', int((ids >= 0).sum()))
+        return ids
+
+    def count(self, ids, categories):
+        # Engagements per region (rows, by position in regions) and category (columns), plus a total column. Every
+        # region and every category of a categorical column is listed, with zero counts where nothing was located
+        frame = pd.DataFrame({'region': ids, 'category': pd.Series(categories).values})
+        counts = (frame[frame['region'] >= 0].groupby(['region', 'category'], observed=False).size()
+                  .unstack('category', fill_value=0).reindex(range(len(self.regions)), fill_value=0))
+        counts['total'] = counts.sum(axis=1).astype(int)
+        return counts
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+# Vocabularies of the enumerated engagement fields
+ENGAGEMENT_TYPES = ['Mil-Mil (US)', 'Mil-Mil (ROK)', 'Civ-Mil']
+IE_CATEGORIES = ['Civilian', 'Military', 'DIV', '8A', 'Higher', 'Holidays']  # IE chart bands, bottom up
+STATUSES = {0: 'in planning', 1: 'for approval', 2: 'approved'}
+
+
+class SchemaError(ValueError):
+    # A data file does not match its schema. Raised while the dataset is loaded, naming the column and the
+    # offending CSV lines, instead of surfacing later as an error deep inside a plot
+    def __init__(self, dataset, column, message, index=()):
+        lines = [line + 2 for line in index[:5]]  # row labels of a fresh read; the header is line 1
+        where = f' (line {", ".join(map(str, lines))}{", ..." if len(index) > 5 else ""})' if lines else ''
+        super().__init__(f'{dataset}: column {column!r} {message}{where}')
+        self.dataset = dataset
+        self.column = column
+
+
+class Column:
+    def __init__(self, required=True):
+        self.required = required
+
+    def convert(self, values, dataset, column):
+        return values
+
+    @staticmethod
+    def check(invalid, dataset, column, message):
+        if invalid.any():
+            raise SchemaError(dataset, column, message, list(invalid.index[invalid.to_numpy()]))
+
+
+class Text(Column):
+    pass
+
+
+class Date(Column):
+    # Parsed to datetime64; an empty or unreadable date is an error
+    def convert(self, values, dataset, column):
+        dates = pd.to_datetime(values, errors='coerce')
+        self.check(dates.isna(), dataset, column, 'has missing or unreadable dates')
+        return dates
+
+
+class Number(Column):
+    def convert(self, values, dataset, column):
+        numbers = pd.to_numeric(values, errors='coerce')
+        self.check(numbers.isna(), dataset, column, 'has missing or non-numeric values')
+        return numbers.astype(float)
+
+
+class Category(Column):
+    # Categorical dtype: one small integer code per row. With a vocabulary, any other value is an error
+    def __init__(self, values=None, required=True):
+        super().__init__(required)
+        self.values = values
+
+    def convert(self, values, dataset, column):
+        if self.values is None:
+            return values.astype('category')
+        categories = values.astype(pd.CategoricalDtype(self.values))
+        unknown = categories.isna() & values.notna()
+        if unknown.any():
+            found = ', '.join(map(repr, pd.unique(values[unknown])[:5]))
+            self.check(unknown, dataset, column, f'has values outside {", ".join(self.values)}: {found}')
+        return categories
+
+
+class Code(Column):
+    # Small integer codes (e.g. a status) restricted to the given values
+    def __init__(self, values, required=True):
+        super().__init__(required)
+        self.values = values
+
+    def convert(self, values, dataset, column):
+        codes = pd.to_numeric(values, errors='coerce')
+        self.check(~codes.isin(list(self.values)), dataset, column,
+                   f'has codes outside {", ".join(map(str, self.values))}')
+        return codes.astype(np.int8)
+
+
+SCHEMAS = {
+    'engagements': {
+        'date': Date(),
+        'location': Category(),
+        'engagement': Text(),
+        'category': Category(ENGAGEMENT_TYPES),
+        'loe': Category(),
+        'color': Category(),
+        'unit': Category(required=False),
+    },
+    'engagements90': {
+        'date': Date(),
+        'location': Category(),
+        'category': Category(IE_CATEGORIES),
+        'type': Category(ENGAGEMENT_TYPES),
+        'engagement': Text(),
+        'status': Code(STATUSES),
+    },
+    'bases': {
+        'name': Text(),
+        'latitude': Number(),
+        'longitude': Number(),
+    },
+}
+
+
+def open_categories(name):
+    # Categorical columns of a dataset without a vocabulary: their categories are the values found in the data
+    return [column for column, spec in SCHEMAS.get(name, {}).items()
+            if isinstance(spec, Category) and spec.values is None]
+
+
+def apply_schema(name, frame, categories=None):
+    # Typed copy of a freshly read frame; datasets without a schema are returned unchanged. When the frame is only
+    # part of the dataset, `categories` gives the values of its open categorical columns in the whole dataset, so
+    # the part gets the same dtypes as the whole
+    schema = SCHEMAS.get(name)
+    if schema is None:
+        return frame
+    missing = [column for column, spec in schema.items() if spec.required and column not in frame.columns]
+    if missing:
+        raise SchemaError(name, missing[0], f'is missing (columns found: {", ".join(map(str, frame.columns))})')
+    frame = frame.copy()
+    for column, spec in schema.items():
+        if column in frame.columns:
+            if categories and column in categories:
+                spec = Category(categories[column], spec.required)
+            frame[column] = spec.convert(frame[column], name, column)
+    return frame
+
+
+class BaseIndex:
+    # Base names and a coordinate array. Locations resolve to row ids once per distinct name (the categories
+    # of a categorical column), so placing engagements never merges or builds per-row geometry
+    def __init__(self, bases):
+        bases = bases.drop_duplicates('name')
+        self.names = pd.Index(bases['name'])
+        self.coordinates = bases[['longitude', 'latitude']].to_numpy(dtype=float)
+
+    def resolve(self, locations):
+        # Base id of every location, -1 where the location is not a known base
+        if not isinstance(locations.dtype, pd.CategoricalDtype):
+            locations = locations.astype('category')
+        ids = np.append(self.names.get_indexer(locations.cat.categories), -1)
+        return ids[locations.cat.codes.to_numpy()]  # code -1 (missing) picks the appended -1
+
+    def lookup(self, ids):
+        # (longitude, latitude) arrays for base ids; NaN for -1
+        coordinates = np.vstack([self.coordinates, [np.nan, np.nan]])
+        return coordinates[ids, 0], coordinates[ids, 1]
@@ -1,18 +1,150 @@
-import pandas as pd
-import geopandas as gpd
 import os
+import threading
+import pandas as pd
+from data.cache import cache_key, source_mtime
+from data.schema import apply_schema
+from instrumentation.tracer import tracer
+
+
+class Dataset:
+    # Describes one file backed dataset; the frame itself is only read on first access
+    def __init__(self, filename, reader='csv'):
+        self.filename = filename
+        self.reader = reader
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, server, owner=None):
+        if server is None:
+            return self
+        return server.load(self.name)
+
+    def __set__(self, server, value):
+        # Allow callers to swap in their own frame (e.g. a filtered slice)
+        with server.lock:
+            server.cache[self.name] = value
+
+    def read(self, path):
+        if self.reader == 'shapefile':
+            # geopandas is only imported when a geospatial dataset is actually requested
+            import geopandas as gpd
+            return gpd.read_file(path)
+        # Typed and validated on load, so a malformed file fails here rather than halfway through a render
+        return apply_schema(self.name, pd.read_csv(path))
 
 
 class Server:
+    engagements = Dataset('engagements.csv')
+    engagements90 = Dataset('engagements90.csv')
+    sample_engagements = Dataset('sample_engagement.csv')
+    locations = Dataset('locations.csv')
+    bases = Dataset('bases.csv')
+    countries = Dataset('10m_cultural/ne_10m_admin_0_countries_usa.shp', reader='shapefile')
+
     def __init__(self, include_maps=False):
         self.files = []
-        self.engagements = pd.read_csv(self.get_relative_path('engagements.csv'))
-        self.engagements90 = pd.read_csv(self.get_relative_path('engagements90.csv'))
-        self.sample_engagements = pd.read_csv(self.get_relative_path('sample_engagement.csv'))
+        self.cache = {}
+        self.lock = threading.RLock()
+        self.store = None
         if include_maps:
-            self.locations = pd.read_csv(self.get_relative_path('locations.csv'))
-            self.bases = pd.read_csv(self.get_relative_path('bases.csv'))
-            self.countries = gpd.read_file(self.get_relative_path('10m_cultural/ne_10m_admin_0_countries_usa.shp'))
+            self.load('locations', 'bases', 'countries')
+
+    @classmethod
+    def dataset_names(cls):
+        return [name for name, attr in vars(cls).items() if isinstance(attr, Dataset)]
+
+    @classmethod
+    def get_dataset(cls, name):
+        dataset = vars(cls).get(name)
+        if not isinstance(dataset, Dataset):
+            raise KeyError(f"Unknown dataset '{name}'. Available datasets: {', '.join(cls.dataset_names())}")
+        return dataset
+
+    def load(self, *names):
+        # Load each requested dataset once; returns the frame (or a list of frames for several names)
+        frames = []
+        with self.lock:
+            for name in names:
+                if name not in self.cache:
+                    dataset = self.get_dataset(name)
+                    path = self.get_relative_path(dataset.filename)
+                    with tracer.span('server.load', dataset=name):
+                        self.cache[name] = dataset.read(path)
+                    tracer.count('rows.loaded', len(self.cache[name]))
+                    if path not in self.files:
+                        self.files.append(path)
+                frames.append(self.cache[name])
+        return frames[0] if len(frames) == 1 else frames
+
+    def reload(self, *names):
+        # Drop and re-read datasets, e.g. after the underlying file changed
+        names = names or tuple(self.cache)
+        self.unload(*names)
+        return self.load(*names) if names else None
+
+    def unload(self, *names):
+        with self.lock:
+            for name in names or tuple(self.cache):
+                self.get_dataset(name)
+                self.cache.pop(name, None)
+
+    def is_loaded(self, name):
+        self.get_dataset(name)
+        return name in self.cache
+
+    def iter_chunks(self, name, chunksize=1000):
+        # Yields the dataset as frames of at most chunksize rows. A CSV that is not loaded yet is streamed from
+        # disk, so the whole file is never held in memory
+        dataset = self.get_dataset(name)
+        if self.is_loaded(name) or dataset.reader != 'csv':
+            frame = self.load(name)
+            for start in range(0, len(frame), chunksize):
+                yield frame.iloc[start:start + chunksize]
+            return
+        for chunk in pd.read_csv(self.get_relative_path(dataset.filename), chunksize=chunksize):
+            yield apply_schema(name, chunk)
+
+    def data_version(self, *names):
+        # Short hash of the source file timestamps; changes whenever one of the datasets does
+        names = names or tuple(self.dataset_names())
+        return cache_key([(name, source_mtime(self.get_relative_path(self.get_dataset(name).filename)))
+                          for name in names])
+
+    def get_store(self):
+        if self.store is None:
+            # Imported here: data.store builds on this module
+            from data.store import EngagementStore
+            self.store = EngagementStore()
+        return self.store
+
+    def window(self, name, start=None, end=None, unit=None):
+        # Rows with start <= date < end, dates already parsed. Served from the indexed store when it is current
+        # and the full frame is not already in memory; otherwise filtered from the frame
+        with tracer.span('server.window', dataset=name):
+            return self.filter_window(name, start, end, unit)
+
+    def filter_window(self, name, start, end, unit):
+        store = self.get_store()
+        if not self.is_loaded(name) and store.is_current(name):
+            result = store.query(name, start, end, unit)
+            tracer.count('rows.queried', len(result))
+            return result
+
+        frame = self.load(name)
+        date_column = store.date_columns[name]
+        dates = pd.to_datetime(frame[date_column])
+        mask = pd.Series(True, index=frame.index)
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates < end
+        if unit is not None and 'unit' in frame.columns:
+            mask &= frame['unit'] == unit
+        result = frame[mask].copy()
+        result[date_column] = dates[mask]
+        return result.reset_index(drop=True)
 
     @staticmethod
     def get_relative_path(filename):
@@ -22,5 +154,6 @@ class Server:
         return os.path.join(script_dir, filename)
 
 
+# A single shared server; nothing is read until a dataset is first accessed
 data_server = Server()
-map_server = Server(include_maps=True)
+map_server = data_server
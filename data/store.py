@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import pandas as pd
+from data.schema import apply_schema, open_categories
+from data.server import Server
+
+
+class EngagementStore:
+    # SQLite copy of the engagement CSVs with parsed, indexed dates so window queries only read matching rows
+    date_columns = {'engagements': 'date', 'engagements90': 'date', 'sample_engagements': 'Date/Time'}
+
+    def __init__(self, path=None):
+        self.path = path or Server.get_relative_path('engagements.db')
+
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute('CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, mtime REAL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS categories (dataset TEXT, field TEXT, value TEXT)')
+        return connection
+
+    def import_csv(self, name):
+        date_column = self.date_columns[name]
+        source = Server.get_relative_path(Server.get_dataset(name).filename)
+        df = pd.read_csv(source, parse_dates=[date_column])
+
+        with self.connect() as connection:
+            df.to_sql(name, connection, if_exists='replace', index=False)
+            connection.execute(f'CREATE INDEX "{name}_date" ON "{name}" ("{date_column}")')
+            if 'unit' in df.columns:
+                connection.execute(f'CREATE INDEX "{name}_unit_date" ON "{name}" (unit, "{date_column}")')
+            # The values of the open categorical columns in the whole file, so windows get the full categories
+            connection.execute('DELETE FROM categories WHERE dataset = ?', (name,))
+            connection.executemany('INSERT INTO categories VALUES (?, ?, ?)',
+                                   [(name, column, value) for column in open_categories(name) if column in df.columns
+                                    for value in pd.unique(df[column].dropna()).tolist()])
+            connection.execute('INSERT OR REPLACE INTO sources VALUES (?, ?)', (name, os.path.getmtime(source)))
+        return len(df)
+
+    def import_all(self):
+        return {name: self.import_csv(name) for name in self.date_columns}
+
+    def imported(self):
+        # Names of the datasets that have a table in the database
+        if not os.path.exists(self.path):
+            return set()
+        with self.connect() as connection:
+            return {row[0] for row in connection.execute('SELECT name FROM sources')}
+
+    def is_current(self, name):
+        # The table is only used while it still matches the CSV it was imported from
+        if name not in self.date_columns or not os.path.exists(self.path):
+            return False
+        source = Server.get_relative_path(Server.get_dataset(name).filename)
+        with self.connect() as connection:
+            row = connection.execute('SELECT mtime FROM sources WHERE name = ?', (name,)).fetchone()
+        return row is not None and row[0] == os.path.getmtime(source)
+
+    @staticmethod
+    def columns(connection, name):
+        return {row[1] for row in connection.execute(f'PRAGMA table_info("{name}")')}
+
+    def query(self, name, start=None, end=None, unit=None):
+        # Rows with start <= date < end (either bound optional), optionally for one unit. Like the in-memory
+        # filter, the unit is ignored for tables without a unit column
+        date_column = self.date_columns[name]
+        clauses, params = [], []
+        if start is not None:
+            clauses.append(f'"{date_column}" >= ?')
+            params.append(pd.Timestamp(start).isoformat(sep=' '))
+        if end is not None:
+            clauses.append(f'"{date_column}" < ?')
+            params.append(pd.Timestamp(end).isoformat(sep=' '))
+
+        with self.connect() as connection:
+            if unit is not None and 'unit' in self.columns(connection, name):
+                clauses.append('unit = ?')
+                params.append(unit)
+            where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+            frame = pd.read_sql_query(f'SELECT rowid - 1 AS source_row, * FROM "{name}"{where} ORDER BY rowid',
+                                      connection, params=params, parse_dates=[date_column], index_col='source_row')
+            categories = {}
+            for field, value in connection.execute('SELECT field, value FROM categories WHERE dataset = ?', (name,)):
+                categories.setdefault(field, []).append(value)
+        # Rows are labelled with their position in the imported CSV while the schema is applied, so a SchemaError
+        # names the right CSV line; the result is then numbered from 0 like the in-memory window. Categories are
+        # sorted like those of a full read
+        frame.index.name = None
+        categories = {field: sorted(values) for field, values in categories.items()}
+        return apply_schema(name, frame, categories).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    # Import (or refresh) every engagement CSV into the store
+    for table, rows in EngagementStore().import_all().items():
+        print(f'{table}: {rows} rows')
@@ -0,0 +1,135 @@
+import argparse
+import os
+from datetime import datetime
+from instrumentation.tracer import tracer
+
+# Every subcommand imports its generator when it runs, so e.g. concept slides never pay for cartopy or pyplot
+
+
+def select_window(args):
+    from slides import fiscal
+    return fiscal.select_window(args.fiscal_week, args.fiscal_year, args.unit)
+
+
+def run_calendar(args):
+    from graphics.render import write_buffer
+    from slides.cua_slide.engagement_calendar import CalendarPlotter
+    fiscal_week, engagements, start_date = select_window(args)
+    plotter = CalendarPlotter(fiscal_week, args.output, engagements, start_date)
+    plotter.draw_frame(reuse=True)
+    plotter.plot_engagements()
+    write_buffer(plotter.render(), args.output)
+    return [args.output]
+
+
+def run_map(args):
+    from graphics.render import write_buffer
+    from slides.cua_slide.map import MapPlotter
+    _, engagements, _ = select_window(args)
+    write_buffer(MapPlotter(args.output, engagements).render(mode=args.mode), args.output)
+    return [args.output]
+
+
+def run_ie(args):
+    from graphics.render import write_buffer
+    from slides.ie_slide.ie_calendar import InformationEnvironmentGenerator
+    generator = InformationEnvironmentGenerator(args.output)
+    if args.today:
+        generator.today = args.today
+    write_buffer(generator.render(), args.output)
+    return [args.output]
+
+
+def run_concept(args):
+    from slides.concept_slide.concept_slide_generator import ConceptSlideGenerator
+    generator = ConceptSlideGenerator(output_ppt=args.output, image=args.image)
+    if args.max_slides:
+        return generator.generate_streaming(max_slides=args.max_slides)
+    generator.generate()
+    return [args.output]
+
+
+def run_deck(args):
+    from slides.cua_slide.engagements_plotter import EngagementsPlotter
+    fiscal_week, engagements, start_date = select_window(args)
+    plotter = EngagementsPlotter(ppt_output=args.output, fiscal_week=fiscal_week, unit=args.unit,
+                                 engagements=engagements, start_date=start_date)
+    if args.native:
+        plotter.create_native_ppt()
+    else:
+        plotter.render_all(parallel=args.parallel)
+    return [args.output]
+
+
+def existing_file(path):
+    # argparse type: also applied to string defaults, so a missing default file is reported up front
+    if not os.path.isfile(path):
+        raise argparse.ArgumentTypeError(f"no such file: '{path}'")
+    return path
+
+
+def add_window_arguments(parser):
+    parser.add_argument('--fiscal-week', type=int, default=None,
+                        help='first fiscal week of the four-week window (default: all engagements)')
+    parser.add_argument('--fiscal-year', type=int, default=None, help='defaults to the current fiscal year')
+    parser.add_argument('--unit', default='2ID/RUCD')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='engagements', description='Render engagement slides and charts.')
+    parser.add_argument('--trace', default=None, metavar='JSON', help='write stage timings and counters to this file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    calendar = commands.add_parser('calendar', help='four-week engagement calendar (PNG)')
+    add_window_arguments(calendar)
+    calendar.add_argument('--output', default='calendar.png')
+    calendar.set_defaults(run=run_calendar)
+
+    theater_map = commands.add_parser('map', help='engagement map of the theater (PNG)')
+    add_window_arguments(theater_map)
+    theater_map.add_argument('--output', default='map.png')
+    theater_map.add_argument('--mode', choices=('pucks', 'regions'), default='pucks',
+                             help='one puck per engagement, or provinces shaded by their number of engagements')
+    theater_map.set_defaults(run=run_map)
+
+    ie = commands.add_parser('ie', help='90 day information environment chart (PNG)')
+    ie.add_argument('--today', type=lambda value: datetime.strptime(value, '%Y-%m-%d'), default=None,
+                    help='date the 90 day window is computed from, YYYY-MM-DD (default: today)')
+    ie.add_argument('--output', default='90-day-information-env.png')
+    ie.set_defaults(run=run_ie)
+
+    concept = commands.add_parser('concept', help='one concept slide per engagement (PPTX)')
+    concept.add_argument('--output', default='concept_slides.pptx')
+    concept.add_argument('--image', type=existing_file, default='images/img.png',
+                         help='picture placed on every slide (default: images/img.png)')
+    concept.add_argument('--max-slides', type=int, default=None,
+                         help='stream the engagements and split the output into decks of at most this many slides')
+    concept.set_defaults(run=run_concept)
+
+    deck = commands.add_parser('deck', help='calendar and map slide (PPTX)')
+    add_window_arguments(deck)
+    deck.add_argument('--output', default='engagements.pptx')
+    deck.add_argument('--native', action='store_true',
+                      help='draw the calendar and map pucks as editable shapes instead of pictures')
+    deck.add_argument('--parallel', action='store_true', help='render the panels in worker processes')
+    deck.set_defaults(run=run_deck)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.trace:
+        tracer.enable()
+    try:
+        paths = args.run(args)
+    except FileNotFoundError as error:
+        parser.exit(1, f'{parser.prog}: error: {error}\n')
+    for path in paths:
+        print(path)
+    if args.trace:
+        print(tracer.export(args.trace))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import matplotlib.pyplot as plt
+import matplotlib.image as mpimg
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+from data.cache import cache_key, cache_path
+from data.catalog import catalog
+from data.geometry import country_geometry
+from graphics.lod import LevelOfDetail
+from graphics.render import atomic_path, save_figure
+from instrumentation.tracer import traced
+
+# Static layers of the Korea theater map; anything in here is baked into the cached raster
+KOREA_STYLE = {
+    'coastline': {'linewidth': 1},
+    'borders': {'linestyle': ':'},
+    'ocean': {'facecolor': 'lightgrey'},
+    'land': {'facecolor': 'lightgrey'},
+    'lakes': {'facecolor': 'white'},
+    'rivers': {'edgecolor': 'blue'},
+    'countries': {'KOR': 'lightblue', 'PRK': 'red', 'JPN': 'white'},
+    # Optional catalog layers drawn on top, e.g. {'admin_0_boundary_lines_maritime_indicator': {'color': 'navy'}}
+    'overlays': {},
+}
+
+
+class Basemap:
+    # Rasters already read in this process, shared by every Basemap with the same key
+    loaded = {}
+
+    def __init__(self, extent, figsize=(10, 12), dpi=100, style=None, geometry=country_geometry):
+        self.extent = list(extent)
+        self.figsize = tuple(figsize)
+        self.dpi = float(dpi)
+        self.style = style or KOREA_STYLE
+        self.geometry = geometry
+        self.lod = LevelOfDetail(self.extent, self.figsize, self.dpi)
+        self.key = cache_key(self.extent, self.figsize, self.dpi, self.style, self.lod.key)
+        self.path = cache_path('basemap', self.key, 'png')
+        self.layout_path = cache_path('basemap', self.key, 'json')
+        self.image = None
+        self.layout = None
+
+    @traced('basemap.draw_layers')
+    def draw_layers(self, ax):
+        # Draw the static background directly onto a cartopy axes, at the level of detail the output resolves
+        ax.set_extent(self.extent, crs=ccrs.PlateCarree())
+        ax.add_feature(self.lod.feature(cfeature.COASTLINE), **self.style['coastline'])
+        ax.add_feature(self.lod.feature(cfeature.BORDERS), **self.style['borders'])
+        ax.add_feature(self.lod.feature(cfeature.OCEAN), **self.style['ocean'])
+        ax.add_feature(self.lod.feature(cfeature.LAND), **self.style['land'])
+        ax.add_feature(self.lod.feature(cfeature.LAKES), **self.style['lakes'])
+        ax.add_feature(self.lod.feature(cfeature.RIVERS), **self.style['rivers'])
+
+        fills = self.style['countries']
+        if fills:
+            countries = self.geometry.load(self.extent, codes=list(fills), tolerance=self.lod.tolerance)
+            for code, facecolor in fills.items():
+                self.geometry.select(countries, code).plot(ax=ax, facecolor=facecolor)
+
+        # Only the overlay features inside the extent are read
+        overlays = self.style.get('overlays')
+        if overlays:
+            frames = catalog.load(self.extent, names=list(overlays), tolerance=self.lod.tolerance)
+            for name, frame in frames.items():
+                frame.plot(ax=ax, **overlays[name])
+
+    @traced('basemap.render')
+    def render(self):
+        # Render the layers once, laid out exactly like the target axes, and keep only the axes area
+        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi, subplot_kw={'projection': ccrs.PlateCarree()})
+        self.draw_layers(ax)
+        ax.axis('off')
+        ax.apply_aspect()
+        bbox = ax.get_window_extent().transformed(fig.dpi_scale_trans.inverted())
+        save_figure(fig, self.path, dpi=self.dpi, bbox_inches=bbox, pad_inches=0)
+
+        # geopandas adjusts the aspect for geographic data, so remember how the axes ended up laid out
+        layout = {'aspect': ax.get_aspect(), 'xlim': list(ax.get_xlim()), 'ylim': list(ax.get_ylim())}
+        with atomic_path(self.layout_path) as temp, open(temp, 'w') as f:
+            json.dump(layout, f)
+        plt.close(fig)
+
+    def load(self):
+        if self.image is None:
+            if self.key not in self.loaded:
+                if not (os.path.exists(self.path) and os.path.exists(self.layout_path)):
+                    self.render()
+                with open(self.layout_path) as f:
+                    self.loaded[self.key] = (mpimg.imread(self.path), json.load(f))
+            self.image, self.layout = self.loaded[self.key]
+        return self.image
+
+    @traced('basemap.draw')
+    def draw(self, ax, zorder=0):
+        # Paint the cached raster under everything else, with the axes laid out as when it was rendered
+        image = self.load()
+        xlim, ylim = self.layout['xlim'], self.layout['ylim']
+        ax.imshow(image, extent=(*xlim, *ylim), origin='upper', transform=ax.projection, interpolation='none',
+                  zorder=zorder)
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
+        ax.set_aspect(self.layout['aspect'])
@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import pandas as pd
+import shapely
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+from data.cache import cache_key, cache_path
+from instrumentation.tracer import traced, tracer
+
+
+class LevelOfDetail:
+    # How much detail a map can show: the size of one output pixel in degrees, from the extent, figure size and
+    # DPI. It picks the coarsest Natural Earth scale that still resolves a pixel and a simplification tolerance
+    # of half a pixel, so vertices closer together than the output can show are dropped before drawing
+    scales = (('10m', 0.02), ('50m', 0.1))  # (scale, largest pixel in degrees it is used for); beyond: 110m
+    memory = {}
+
+    def __init__(self, extent, figsize, dpi):
+        self.extent = list(extent)
+        x0, x1, y0, y1 = self.extent
+        width, height = figsize
+        self.degrees_per_pixel = max((x1 - x0) / (width * dpi), (y1 - y0) / (height * dpi))
+
+    @property
+    def scale(self):
+        for scale, largest_pixel in self.scales:
+            if self.degrees_per_pixel <= largest_pixel:
+                return scale
+        return '110m'
+
+    @property
+    def tolerance(self):
+        # Rounded to two significant digits, so nearly identical outputs share one cached level
+        return float(f'{self.degrees_per_pixel / 2:.2g}')
+
+    @property
+    def key(self):
+        return self.scale, self.tolerance
+
+    def simplify(self, geometries):
+        # Topology-preserving simplification: rings stay valid and holes stay inside their polygons
+        simplified = shapely.simplify(geometries, self.tolerance, preserve_topology=True)
+        tracer.count('vertices.kept', int(shapely.get_num_coordinates(simplified).sum()))
+        return simplified
+
+    @traced('lod.feature')
+    def feature(self, feature):
+        # A cartopy Natural Earth feature at this level: read at the chosen scale, clipped to the extent (plus a
+        # margin, so clipped edges fall outside the axes) and simplified; cached in memory and on disk per
+        # feature and level
+        key = cache_key(feature.category, feature.name, self.extent, self.key)
+        if key not in self.memory:
+            path = cache_path('lod', key, 'pkl')
+            if os.path.exists(path):
+                geometries = shapely.from_wkb(pd.read_pickle(path))
+            else:
+                x0, x1, y0, y1 = self.extent
+                margin = 0.1 * max(x1 - x0, y1 - y0)
+                source = feature.with_scale(self.scale).intersecting_geometries(self.extent)
+                clipped = shapely.clip_by_rect(np.array(list(source), dtype=object),
+                                               x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+                geometries = self.simplify(clipped[~shapely.is_empty(clipped)])
+                pd.to_pickle(shapely.to_wkb(geometries), path)
+            self.memory[key] = cfeature.ShapelyFeature(geometries, ccrs.PlateCarree(), **feature.kwargs)
+        return self.memory[key]
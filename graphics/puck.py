@@ -1,4 +1,11 @@
+from functools import lru_cache
+import numpy as np
 import matplotlib.patches as mpatches
+import matplotlib.transforms as mtransforms
+from matplotlib.collections import PatchCollection, PathCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.textpath import TextPath
+from instrumentation.tracer import traced, tracer
 
 
 class Puck:
@@ -33,6 +40,7 @@ class Puck:
         ax.add_patch(marker)
         ax.text(self.x, self.y, str(self.number), fontsize=self.font, ha='center', va='center', color='white',
                 fontweight='bold', zorder=self.zorder + 1)
+        tracer.count('artists.created', 3 if shadow else 2)
 
     def create_shadow(self):
         shadow_color = (0, 0, 0, 0.3)  # black with 30% opacity
@@ -60,3 +68,86 @@ class IEPuck(Puck):
             self.color = 'darkorange'
         elif self.approved == 2:
             self.color = 'green'
+
+
+class PuckLayer:
+    # Draws many pucks at once: one collection per marker shape, one for all shadows and one for all numbers,
+    # so the artist count stays constant no matter how many engagements are plotted
+    shapes = {'Mil-Mil (US)': 'triangle', 'Mil-Mil (ROK)': 'circle'}
+
+    def __init__(self, x, y, category, color, number, scale=1, font=10, zorder=11):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.category = np.asarray(category, dtype=object)
+        self.color = np.asarray(color, dtype=object)
+        self.number = np.asarray(number)
+        self.scale = scale
+        self.font = font
+        self.zorder = zorder
+
+    def __len__(self):
+        return len(self.x)
+
+    @classmethod
+    def marker_size(cls, category, scale=1):
+        # Width and height of a category's marker in data units, as drawn by Puck.create_marker
+        shape = cls.shapes.get(category, 'square')
+        if shape == 'triangle':
+            return 0.18 * scale, 0.12 * np.sqrt(3) * scale
+        if shape == 'circle':
+            return 0.16 * scale, 0.16 * scale
+        return 0.12 * scale, 0.12 * scale
+
+    def pucks(self):
+        for x, y, category, color, number in zip(self.x, self.y, self.category, self.color, self.number):
+            yield Puck(x, y, category, color, number, scale=self.scale, font=self.font, zorder=self.zorder)
+
+    def create_collections(self):
+        markers = {}
+        shadows = []
+        for puck in self.pucks():
+            markers.setdefault(self.shapes.get(puck.category, 'square'), []).append(puck.create_marker())
+            shadows.append(puck.create_shadow())
+
+        collections = [PatchCollection(shadows, match_original=True, zorder=self.zorder - 1)]
+        for patches in markers.values():
+            collections.append(PatchCollection(patches, match_original=True, zorder=self.zorder))
+        return collections
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def label_path(text, font):
+        # Glyph outlines in points, centred on the origin; shared by every layer using the same label and size
+        path = TextPath((0, 0), text, size=font, prop=FontProperties(weight='bold'))
+        extents = path.get_extents()
+        return path.transformed(
+            mtransforms.Affine2D().translate(-(extents.x0 + extents.x1) / 2, -(extents.y0 + extents.y1) / 2))
+
+    def create_labels(self, ax):
+        # Label paths are sized in points and positioned in data coordinates, like ax.text
+        paths = [self.label_path(str(number), self.font) for number in self.number]
+        points_to_pixels = mtransforms.Affine2D().scale(1 / 72) + ax.figure.dpi_scale_trans
+        return PathCollection(paths, offsets=np.column_stack([self.x, self.y]), offset_transform=ax.transData,
+                              transform=points_to_pixels, facecolors='white', edgecolors='none',
+                              zorder=self.zorder + 1, clip_on=False)
+
+    @traced('pucks.draw')
+    def add_to_axes(self, ax):
+        if not len(self):
+            return []
+        collections = self.create_collections()
+        for collection in collections:
+            ax.add_collection(collection)
+        labels = self.create_labels(ax)
+        ax.add_collection(labels, autolim=False)
+        tracer.count('artists.created', len(collections) + 1)
+        tracer.count('pucks.drawn', len(self))
+        return collections + [labels]
+
+
+class IEPuckLayer(PuckLayer):
+    status_colors = {0: 'brown', 1: 'darkorange', 2: 'green'}
+
+    def __init__(self, x, y, category, number, approved, scale=1, font=10, zorder=11):
+        color = [self.status_colors.get(status, 'gray') for status in approved]
+        super().__init__(x, y, category, color, number, scale, font, zorder)
@@ -0,0 +1,88 @@
+import io
+import os
+import threading
+from contextlib import contextmanager
+from instrumentation.tracer import tracer
+
+
+def figure_to_buffer(fig, fmt='png', close=True, **kwargs):
+    # Render a figure straight into memory and release it (unless it is kept for reuse); nothing touches the disk
+    buffer = io.BytesIO()
+    with tracer.span('savefig', format=fmt):
+        fig.savefig(buffer, format=fmt, bbox_inches='tight', **kwargs)
+    if close:
+        # pyplot is only needed (and imported) once there is a figure to close
+        import matplotlib.pyplot as plt
+        plt.close(fig)
+    tracer.count('bytes.rendered', buffer.getbuffer().nbytes)
+    buffer.seek(0)
+    return buffer
+
+
+@contextmanager
+def atomic_path(path):
+    # Yields a temporary name next to path and moves the finished file into place, so anyone opening path sees
+    # either the previous or the complete new file, never a half-written one
+    temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        yield temp
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def save_figure(fig, path, **kwargs):
+    # fig.savefig to a path, written atomically. The format comes from the final name, not the temporary one
+    kwargs.setdefault('bbox_inches', 'tight')
+    with atomic_path(path) as temp:
+        fig.savefig(temp, format=os.path.splitext(path)[1][1:].lower() or 'png', **kwargs)
+
+
+def write_buffer(buffer, path):
+    with atomic_path(path) as temp, open(temp, 'wb') as f:
+        f.write(buffer.getvalue())
+    buffer.seek(0)
+    tracer.count('bytes.written', buffer.getbuffer().nbytes)
+
+
+class FigureTemplate:
+    # A figure holding a chart's static scaffolding (axes, grid, ticks, background), built once per process and
+    # key. Each render draws the dynamic artists on top, saves, and removes them again, so repeated renders neither
+    # rebuild the scaffolding nor accumulate figures. Templates are plain Figures that pyplot does not track, and
+    # like pyplot itself they serve one render at a time
+    templates = {}
+
+    def __init__(self, fig):
+        self.fig = fig
+        self.static = {id(artist) for artist in self.artists()}
+
+    @classmethod
+    def get(cls, key, build):
+        # build() returns a new Figure with the scaffolding drawn; leftovers of an interrupted render are cleared
+        template = cls.templates.get(key)
+        if template is None:
+            template = cls.templates[key] = cls(build())
+            tracer.count('templates.built')
+        template.reset()
+        return template
+
+    @classmethod
+    def release(cls):
+        # Drop every template, e.g. before a worker goes idle for a long time
+        cls.templates.clear()
+
+    def artists(self):
+        return [*self.fig.get_children(), *(artist for ax in self.fig.axes for artist in ax.get_children())]
+
+    def reset(self):
+        # Remove everything drawn since the scaffolding was built
+        for artist in self.artists():
+            if id(artist) not in self.static:
+                artist.remove()
+
+    def render(self, fmt='png', **kwargs):
+        try:
+            return figure_to_buffer(self.fig, fmt, close=False, **kwargs)
+        finally:
+            self.reset()
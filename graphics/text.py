@@ -0,0 +1,99 @@
+from functools import lru_cache
+import numpy as np
+from matplotlib.font_manager import FontProperties, findfont
+from matplotlib.ft2font import FT2Font, KERNING_UNFITTED, LOAD_NO_HINTING
+
+ELLIPSIS = '…'
+
+
+class FontMetrics:
+    # Glyph advance widths of one font straight from FreeType, without drawing a Text artist. Unhinted advances
+    # scale linearly with the size, so they are measured once at a reference size and serve every size.
+    # Glyphs, kerning pairs and whole strings are LRU cached
+    reference_size = 100
+
+    def __init__(self, weight='normal', family=None):
+        # A private FT2Font: the one matplotlib caches for its renderers changes size while drawing
+        self.font = FT2Font(findfont(FontProperties(family=family, weight=weight)))
+        self.font.set_size(self.reference_size, 72)  # at 72 dpi one pixel is one point
+        self.glyph_width = lru_cache(maxsize=4096)(self.measure_glyph)
+        self.kerning = lru_cache(maxsize=16384)(self.measure_kerning)
+        self.string_width = lru_cache(maxsize=65536)(self.measure_string)
+
+    def measure_glyph(self, char):
+        return self.font.load_char(ord(char), flags=LOAD_NO_HINTING).linearHoriAdvance / 65536
+
+    def measure_kerning(self, left, right):
+        return self.font.get_kerning(self.font.get_char_index(ord(left)), self.font.get_char_index(ord(right)),
+                                     KERNING_UNFITTED) / 64
+
+    def measure_string(self, text):
+        # Width of one line at the reference size, in points
+        width = 0.0
+        previous = None
+        for char in text:
+            width += self.glyph_width(char)
+            if previous is not None:
+                width += self.kerning(previous, char)
+            previous = char
+        return width
+
+
+@lru_cache(maxsize=None)
+def font_metrics(weight='normal', family=None):
+    return FontMetrics(weight, family)
+
+
+class TextLayout:
+    # Measures, wraps and truncates text for one font size using real glyph widths (in points), for labels in
+    # matplotlib figures and in python-pptx text boxes alike. Defaults to matplotlib's default font
+    def __init__(self, size, weight='normal', family=None):
+        self.size = size
+        self.metrics = font_metrics(weight, family)
+        self.line_height = 1.2 * size  # matplotlib's default line spacing
+
+    def width(self, text):
+        # Widest line of the text, in points
+        text = str(text)
+        if '\n' in text:
+            return max(self.width(line) for line in text.split('\n'))
+        return self.metrics.string_width(text) * self.size / self.metrics.reference_size
+
+    def widths(self, texts):
+        return np.array([self.width(text) for text in texts], dtype=float)
+
+    def truncate(self, text, max_width):
+        # The longest prefix of one line that fits, ending in an ellipsis when anything was cut
+        text = str(text)
+        if self.width(text) <= max_width:
+            return text
+        return self.shorten(text, max_width)
+
+    def shorten(self, text, max_width):
+        # Cut text and append an ellipsis, keeping the longest prefix (found by bisection) that fits
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.width(text[:middle].rstrip() + ELLIPSIS) <= max_width:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low].rstrip() + ELLIPSIS
+
+    def wrap(self, text, max_width, max_lines=None):
+        # Greedy word wrap to max_width points; words wider than a line are split. With max_lines, the last
+        # line kept is truncated with an ellipsis if text remains
+        lines = []
+        for word in str(text).split():
+            if lines and self.width(f'{lines[-1]} {word}') <= max_width:
+                lines[-1] = f'{lines[-1]} {word}'
+                continue
+            while len(word) > 1 and self.width(word) > max_width:
+                cut = max(len(self.shorten(word, max_width + self.width(ELLIPSIS))) - 1, 1)
+                lines.append(word[:cut])
+                word = word[cut:]
+            lines.append(word)
+        if max_lines is not None and len(lines) > max_lines:
+            lines = lines[:max_lines]
+            lines[-1] = self.shorten(lines[-1], max_width)
+        return '\n'.join(lines)
@@ -0,0 +1,159 @@
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger('engagements.trace')
+
+# Returned by every span while tracing is off, so a disabled span costs one attribute check and one call
+NULL_SPAN = nullcontext()
+
+
+class Span:
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.start = None
+        self.profile = None
+
+    def __enter__(self):
+        stack = self.tracer.stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        if self.tracer.should_profile(self.name):
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        if self.profile is not None:
+            self.profile.disable()
+            self.tracer.dump_profile(self.name, self.profile)
+        self.tracer.stack().pop()
+        self.tracer.record({'name': self.name, 'parent': self.parent, 'thread': threading.get_ident(),
+                            'start': self.start - self.tracer.origin, 'duration': duration, **self.attrs})
+        return False
+
+
+class Tracer:
+    # Named spans and counters around the stages of a render. Disabled by default; enable() (or the
+    # ENGAGEMENTS_TRACE environment variable, naming the JSON report to write at exit) switches it on
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans = []
+        self.counters = {}
+        self.origin = time.perf_counter()
+        self.log = False
+        self.profile_dir = None
+        self.profile_names = None
+        self.profile_count = 0
+
+    def enable(self, log=False, profile_dir=None, profile=None):
+        # log: also emit every finished span as a JSON log record on the 'engagements.trace' logger.
+        # profile_dir: write a cProfile dump per span into this directory; profile limits that to the given
+        # span names. A span opened while a profiled one is active is not profiled itself
+        self.reset()
+        self.log = log
+        self.profile_dir = profile_dir
+        self.profile_names = set(profile) if profile else None
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+            self.counters = {}
+            self.origin = time.perf_counter()
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attrs)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def should_profile(self, name):
+        if self.profile_dir is None or (self.profile_names is not None and name not in self.profile_names):
+            return False
+        return not any(span.profile is not None for span in self.stack())
+
+    def dump_profile(self, name, profile):
+        with self.lock:
+            self.profile_count += 1
+            number = self.profile_count
+        profile.dump_stats(os.path.join(self.profile_dir, f'{number:04d}-{name}.prof'))
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+        if self.log:
+            logger.info(json.dumps(span, default=str))
+
+    def summary(self):
+        # Count, total and longest duration per span name
+        totals = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(span['name'], {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += span['duration']
+            entry['max'] = max(entry['max'], span['duration'])
+        return totals
+
+    def report(self):
+        with self.lock:
+            spans, counters = list(self.spans), dict(self.counters)
+        return {'pid': os.getpid(), 'summary': self.summary(), 'counters': counters, 'spans': spans}
+
+    def export(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        return path
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    # Decorator form of tracer.span for whole functions and methods
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with Span(tracer, name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+if os.environ.get('ENGAGEMENTS_TRACE'):
+    # Production runs can be traced without touching the code: ENGAGEMENTS_TRACE=trace.json
+    tracer.enable(log=bool(os.environ.get('ENGAGEMENTS_TRACE_LOG')),
+                  profile_dir=os.environ.get('ENGAGEMENTS_TRACE_PROFILE') or None)
+    atexit.register(tracer.export, os.environ['ENGAGEMENTS_TRACE'])
@@ -0,0 +1,36 @@
+from slides.incremental import BuildManifest
+from slides.cua_slide.engagements_plotter import EngagementsPlotter
+from slides.ie_slide.ie_calendar import InformationEnvironmentGenerator
+from slides.concept_slide.concept_slide_generator import ConceptSlideGenerator
+
+# Artifact builders, in build order, with the datasets each one reads
+BUILDERS = {
+    'engagements': (EngagementsPlotter, ('engagements', 'bases')),
+    'ie': (InformationEnvironmentGenerator, ('engagements90',)),
+    'concept': (ConceptSlideGenerator, ('sample_engagements',)),
+}
+
+
+def dependents(datasets):
+    # Names of the builders reading any of the given datasets
+    return [name for name, (_, reads) in BUILDERS.items() if set(reads) & set(datasets)]
+
+
+def build_all(manifest_path='build_manifest.json', only=None):
+    # Rebuild only the artifacts whose input rows or render parameters changed since the last run;
+    # `only` restricts the run to some of the builders
+    manifest = BuildManifest(manifest_path)
+    rebuilt = []
+    try:
+        for name, (builder, _) in BUILDERS.items():
+            if only is None or name in only:
+                rebuilt += builder().build(manifest)
+    finally:
+        # Artifacts recorded before a failing builder stay fresh for the next run
+        manifest.save()
+    return rebuilt
+
+
+if __name__ == '__main__':
+    for artifact in build_all():
+        print(artifact)
@@ -2,20 +2,34 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.dml.color import RGBColor
+import copy
+import os
+import re
+import warnings
 import pandas as pd
+from pptx.oxml.ns import qn
+from data.cache import cache_path
 from data.server import data_server
+from instrumentation.tracer import traced, tracer
+from slides.pptx_tools import clone_slide, save_presentation
 
 
 class ConceptSlideGenerator:
-    def __init__(self, engagements_file='data/sample_engagement.csv', output_ppt='concept_slides.pptx'):
+    # Template slides carry "{{column}}" markers where each engagement's values go
+    field_pattern = re.compile(r'\{\{(.+?)\}\}')
+    messages_field = 'Messages / Effects'
+
+    def __init__(self, engagements_file='data/sample_engagement.csv', output_ppt='concept_slides.pptx',
+                 image='images/img.png'):
         self.engagements_file = engagements_file
         self.output_ppt = output_ppt
+        self.image = image
         self.engagements = None
-        self.load_engagements()
 
     def load_engagements(self):
         # Load engagement data using data_server
         self.engagements = data_server.sample_engagements
+        return self.engagements
 
     @staticmethod
     def create_shadow(element):
@@ -81,7 +95,7 @@ class ConceptSlideGenerator:
         add_paragraph(left_frame, "Uniform", engagement['Uniform'])
 
         # Add picture box
-        img = slide.shapes.add_picture('images/img.png', Inches(5.25), Inches(1), Inches(4.5), Inches(3))
+        img = slide.shapes.add_picture(self.image, Inches(5.25), Inches(1), Inches(4.5), Inches(3))
         self.create_shadow(img)
 
         # Add Top Line Messages / Desired Effects box
@@ -114,17 +128,116 @@ class ConceptSlideGenerator:
         add_requirement("PAO Support", engagement['PAO Support'])
         add_requirement("Inclement Weather", engagement['Inclement Weather'])
 
+    @traced('concept.generate')
     def generate(self):
         prs = Presentation()
         layout = prs.slide_layouts[5]  # Blank layout
 
-        for idx, engagement in self.engagements.iterrows():
+        engagements = self.engagements if self.engagements is not None else self.load_engagements()
+        for idx, engagement in engagements.iterrows():
             slide = prs.slides.add_slide(layout)
             self.create_slide(slide, engagement)
-
-        prs.save(self.output_ppt)
-
-
-# Example usage
-generator = ConceptSlideGenerator()
-generator.generate()
+        tracer.count('slides.created', len(engagements))
+
+        save_presentation(prs, self.output_ppt)
+
+    def create_template(self, columns):
+        # The slide skeleton (boxes, shadows, fills, styled runs and the picture) is built once, with field
+        # markers in place of the values
+        template = Presentation()
+        slide = template.slides.add_slide(template.slide_layouts[5])
+        self.create_slide(slide, pd.Series({column: f'{{{{{column}}}}}' for column in columns}))
+        return slide
+
+    def fill_slide(self, slide, engagement):
+        # Replace the markers of a cloned template slide; only the text runs change
+        messages_marker = f'{{{{{self.messages_field}}}}}'
+        messages = None
+        for text in slide.shapes._spTree.iter(qn('a:t')):
+            if text.text == messages_marker:
+                messages = text
+            elif '{{' in text.text:
+                text.text = self.field_pattern.sub(lambda match: str(engagement[match.group(1)]), text.text)
+
+        if messages is not None:
+            # One paragraph per message, keeping the messages box at least four paragraphs tall as create_slide
+            # does; the template has one message followed by two padding paragraphs
+            values = [message.strip() for message in str(engagement[self.messages_field]).split(';')]
+            paragraph = messages.getparent().getparent()
+            padding = [sibling for sibling in paragraph.itersiblings() if sibling.tag == qn('a:p')]
+            messages.text = values[0]
+            for value in reversed(values[1:]):
+                extra = copy.deepcopy(paragraph)
+                extra.find(f'.//{qn("a:t")}').text = value
+                paragraph.addnext(extra)
+            for pad in padding[:len(values) - 1]:
+                pad.getparent().remove(pad)
+        return slide
+
+    def part_path(self, part):
+        base, ext = os.path.splitext(self.output_ppt)
+        return f'{base}_{part}{ext}'
+
+    @traced('concept.generate_streaming')
+    def generate_streaming(self, chunksize=500, max_slides=500):
+        # Large sets: engagements are streamed from the data source in chunks, every slide is a clone of one
+        # template with only its text filled in, and the output is split into decks of at most max_slides
+        # slides (named output_1.pptx, output_2.pptx, ... when there is more than one), so memory stays
+        # bounded by one chunk and one deck. Adding a slide gets slower as a deck grows, which also makes
+        # smaller decks faster to build
+        template = None
+        outputs = []
+        prs = None
+        for chunk in data_server.iter_chunks('sample_engagements', chunksize):
+            if template is None:
+                template = self.create_template(chunk.columns)
+            for engagement in chunk.to_dict('records'):
+                if prs is None or len(prs.slides) == max_slides:
+                    if prs is not None:
+                        outputs.append(self.part_path(len(outputs) + 1))
+                        save_presentation(prs, outputs[-1])
+                    prs, image_parts = Presentation(), {}
+                self.fill_slide(clone_slide(template, prs, image_parts), engagement)
+                tracer.count('slides.created')
+
+        # A set that fits in a single deck keeps the plain output name
+        outputs.append(self.part_path(len(outputs) + 1) if outputs else self.output_ppt)
+        save_presentation(prs or Presentation(), outputs[-1])
+        return outputs
+
+    @traced('concept.build')
+    def build(self, manifest):
+        # Incremental generation: every slide is cached as a one-slide deck keyed on its row, so only new or
+        # changed engagements are rebuilt; the deck is then reassembled from the cached slides
+        if not os.path.exists(self.image):
+            # The slide picture is not bundled; the other artifacts of a build are still made
+            warnings.warn(f'Skipping {self.output_ppt}: the concept slide image {self.image} is missing')
+            return []
+        if self.engagements is None:
+            self.load_engagements()
+        fingerprints = manifest.row_fingerprints(self.engagements, image=self.image,
+                                                 image_mtime=os.path.getmtime(self.image))
+        deck_fingerprint = manifest.fingerprint(slides=fingerprints)
+        if manifest.is_fresh(self.output_ppt, deck_fingerprint):
+            return []
+
+        rebuilt = []
+        prs = Presentation()
+        for (idx, engagement), fingerprint in zip(self.engagements.iterrows(), fingerprints):
+            path = cache_path('concept', fingerprint[:16], 'pptx')
+            if not os.path.exists(path):
+                single = Presentation()
+                self.create_slide(single.slides.add_slide(single.slide_layouts[5]), engagement)
+                save_presentation(single, path)
+                rebuilt.append(path)
+            clone_slide(Presentation(path).slides[0], prs)
+
+        save_presentation(prs, self.output_ppt)
+        manifest.record(self.output_ppt, deck_fingerprint)
+        return rebuilt + [self.output_ppt]
+
+
+if __name__ == '__main__':
+    # Example usage
+    generator = ConceptSlideGenerator()
+    generator.generate()
@@ -0,0 +1,144 @@
+import argparse
+import io
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import pandas as pd
+from pptx import Presentation
+from data.server import data_server
+from instrumentation.tracer import tracer
+from slides.cua_slide.engagement_calendar import CalendarPlotter
+from slides.cua_slide.engagements_plotter import EngagementsPlotter, PANELS
+from slides.cua_slide.map import MapPlotter
+from slides.fiscal import current_fiscal_year, fiscal_week_start
+from slides.pptx_tools import save_presentation
+
+
+class DeckJob:
+    def __init__(self, unit, first_week, last_week=None, fiscal_year=None, output=None):
+        self.unit = unit
+        self.first_week = first_week
+        self.last_week = first_week + 3 if last_week is None else last_week
+        self.fiscal_year = fiscal_year or current_fiscal_year()
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', unit).strip('_')
+        self.output = output or f'{slug}_FY{self.fiscal_year}_W{self.first_week}-{self.last_week}.pptx'
+
+    @classmethod
+    def parse(cls, spec, fiscal_year=None):
+        # "UNIT:FIRST-LAST" or "UNIT:FIRST", e.g. "2ID/RUCD:30-37"
+        unit, weeks = spec.rsplit(':', 1)
+        first, _, last = weeks.partition('-')
+        return cls(unit, int(first), int(last) if last else None, fiscal_year)
+
+    def windows(self):
+        # One slide per four-week calendar window in the range
+        for fiscal_week in range(self.first_week, self.last_week + 1, 4):
+            yield fiscal_week, fiscal_week_start(fiscal_week, self.fiscal_year)
+
+
+def load_engagements():
+    # Read and parse the engagements once; every job is a slice of this frame
+    engagements = data_server.engagements.copy()
+    engagements['date'] = pd.to_datetime(engagements['date'])
+    return engagements
+
+
+def check_units(engagements, jobs):
+    # Without a unit column the engagements cannot be split by unit: one unit gets every engagement (with a
+    # warning), several units would only get identical copies of the same deck and are refused
+    if 'unit' in engagements.columns:
+        return
+    units = sorted({job.unit for job in jobs})
+    if len(units) > 1:
+        raise ValueError(f'The engagement data has no unit column, so it cannot be split into decks for '
+                         f'{", ".join(units)}')
+    warnings.warn(f'The engagement data has no unit column; the {units[0]} deck shows every engagement')
+
+
+def slice_engagements(engagements, unit, start_date, end_date):
+    mask = (engagements['date'] >= start_date) & (engagements['date'] < end_date)
+    if 'unit' in engagements.columns:
+        mask &= engagements['unit'] == unit
+    return engagements[mask]
+
+
+def render_window(fiscal_week, start_date, engagements):
+    # Worker entry point: every panel of one slide, as PNG bytes plus counters
+    return {name: panel(fiscal_week, engagements, start_date) for name, panel in PANELS.items()}
+
+
+def generate_decks(jobs, output_dir='.', combined=None, workers=None, native=False):
+    engagements = load_engagements()
+    check_units(engagements, jobs)
+    MapPlotter.get_basemap().load()  # render the shared basemap once, before fanning out
+
+    tasks = []
+    for job in jobs:
+        for fiscal_week, start_date in job.windows():
+            window = slice_engagements(engagements, job.unit, start_date, start_date + timedelta(weeks=4))
+            tasks.append((job, fiscal_week, start_date, window))
+
+    if native:
+        # Vector slides need no figures, so they are built straight into the decks below
+        results = [None] * len(tasks)
+    elif workers == 1:
+        results = [render_window(fiscal_week, start_date, window) for _, fiscal_week, start_date, window in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_window, fiscal_week, start_date, window)
+                       for _, fiscal_week, start_date, window in tasks]
+            results = [future.result() for future in futures]
+
+    # Assemble the decks in the parent, in job order
+    decks = {}
+    for (job, fiscal_week, start_date, window), panels in zip(tasks, results):
+        key = combined or os.path.join(output_dir, job.output)
+        prs = decks.setdefault(key, Presentation())
+        title = EngagementsPlotter.get_title(job.unit, fiscal_week)
+        if native:
+            EngagementsPlotter.add_native_slide(prs, title, CalendarPlotter(fiscal_week, engagements=window,
+                                                                            start_date=start_date),
+                                                MapPlotter(engagements=window))
+        else:
+            EngagementsPlotter.add_slide(prs, title, io.BytesIO(panels['calendar'][0]),
+                                         io.BytesIO(panels['map'][0]))
+
+    os.makedirs(output_dir, exist_ok=True)
+    for path, prs in decks.items():
+        save_presentation(prs, path)
+    return list(decks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate engagement decks for several units and fiscal weeks.')
+    parser.add_argument('--job', action='append', required=True, metavar='UNIT:FIRST-LAST',
+                        help='unit and fiscal week range, e.g. "2ID/RUCD:30-37"; may be repeated')
+    parser.add_argument('--fiscal-year', type=int, default=None, help='defaults to the current fiscal year')
+    parser.add_argument('--output-dir', default='.', help='directory for one deck per job')
+    parser.add_argument('--combined', default=None, help='write every job into this single deck instead')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--native', action='store_true',
+                        help='draw the calendar and map pucks as editable shapes instead of pictures')
+    parser.add_argument('--trace', default=None, metavar='JSON',
+                        help='write stage timings and counters to this file (worker processes are not traced; '
+                             'combine with --workers 1 for a full trace)')
+    parser.add_argument('--profile-dir', default=None, help='with --trace, also dump a cProfile file per stage')
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        tracer.enable(profile_dir=args.profile_dir)
+    jobs = [DeckJob.parse(spec, args.fiscal_year) for spec in args.job]
+    try:
+        check_units(data_server.engagements, jobs)
+    except ValueError as error:
+        parser.error(str(error))
+    for path in generate_decks(jobs, args.output_dir, args.combined, args.workers, args.native):
+        print(path)
+    if args.trace:
+        print(tracer.export(args.trace))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import math
+import numpy as np
+import pandas as pd
+from instrumentation.tracer import traced
+
+
+class Declusterer:
+    # Groups nearby map points on a grid index and spreads each group on a hexagonal lattice around its centre,
+    # skipping lattice spots already taken by other groups. Groups larger than badge_threshold collapse into one
+    # count badge. Everything is linear in the number of points: no pairwise overlap checks
+    def __init__(self, merge_radius=0.15, spacing=0.25, badge_threshold=12):
+        self.merge_radius = merge_radius
+        self.spacing = spacing
+        self.badge_threshold = badge_threshold
+        self.lattice = np.zeros((0, 2))
+
+    def cluster(self, x, y):
+        # Points sharing a grid cell form one cluster; neighbouring cells merge when their centroids are close
+        cells = pd.DataFrame({'cx': np.floor(x / self.merge_radius).astype(int),
+                              'cy': np.floor(y / self.merge_radius).astype(int), 'x': x, 'y': y})
+        centroids = cells.groupby(['cx', 'cy'])[['x', 'y']].mean()
+        parent = {cell: cell for cell in centroids.index}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        centre = dict(zip(centroids.index, centroids.values))
+        for (cx, cy), (px, py) in centre.items():
+            for neighbour in ((cx + 1, cy - 1), (cx + 1, cy), (cx + 1, cy + 1), (cx, cy + 1)):
+                if neighbour in centre:
+                    nx, ny = centre[neighbour]
+                    if math.hypot(px - nx, py - ny) <= self.merge_radius:
+                        parent[find(neighbour)] = find((cx, cy))
+
+        roots = [find(cell) for cell in zip(cells['cx'], cells['cy'])]
+        return pd.factorize(pd.Series(roots, dtype=object))[0]
+
+    def lattice_points(self, count):
+        # Hexagonal lattice offsets ordered by distance from the centre, at least `count` of them
+        if len(self.lattice) < count:
+            rings = 1
+            while 1 + 3 * rings * (rings + 1) < count:
+                rings += 1
+            rings += 2  # spare spots for the ones taken by other clusters
+            i, j = np.meshgrid(np.arange(-rings, rings + 1), np.arange(-rings, rings + 1))
+            points = np.column_stack([(i + j / 2).ravel(), (j * math.sqrt(3) / 2).ravel()]) * self.spacing
+            distance = np.hypot(points[:, 0], points[:, 1])
+            points = points[distance <= rings * self.spacing + 1e-9]
+            order = np.lexsort((np.arctan2(points[:, 1], points[:, 0]), np.round(np.hypot(*points.T), 9)))
+            self.lattice = points[order]
+        return self.lattice
+
+    @traced('decluster.place')
+    def place(self, x, y):
+        # Returns (pucks, badges): pucks has the display position of every point that is drawn individually,
+        # badges one row per collapsed cluster with its position and size
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        clusters = self.cluster(x, y) if len(x) else np.zeros(0, dtype=int)
+        frame = pd.DataFrame({'cluster': clusters, 'x': x, 'y': y})
+        groups = frame.groupby('cluster')
+        sizes = groups.size().sort_values(ascending=False, kind='stable')
+        centres = groups[['x', 'y']].mean()
+
+        occupied = {}
+        positions = np.full((len(x), 2), np.nan)
+        badges = []
+        for cluster, size in sizes.items():
+            cx, cy = centres.loc[cluster]
+            if size > self.badge_threshold:
+                # A badge covers its centre and the first ring; step outwards until that footprint is free
+                ring = self.lattice_points(7)[:7]
+                for dx, dy in self.lattice_points(7 * len(ring)) * 2:
+                    bx, by = cx + dx, cy + dy
+                    if not any(self.collides(occupied, bx + rx, by + ry) for rx, ry in ring):
+                        break
+                badges.append((bx, by, size))
+                for rx, ry in ring:
+                    self.occupy(occupied, bx + rx, by + ry)
+                continue
+
+            members = groups.indices[cluster]
+            lattice = self.lattice_points(size)
+            taken = 0
+            for dx, dy in lattice:
+                px, py = cx + dx, cy + dy
+                if not self.collides(occupied, px, py):
+                    self.occupy(occupied, px, py)
+                    positions[members[taken]] = px, py
+                    taken += 1
+                    if taken == size:
+                        break
+            # Fall back to overlapping the last lattice spot if the neighbourhood is saturated
+            positions[members[taken:]] = cx + lattice[-1, 0], cy + lattice[-1, 1]
+
+        collapsed = frame['cluster'].isin(sizes[sizes > self.badge_threshold].index).values
+        pucks = pd.DataFrame({'x': positions[:, 0], 'y': positions[:, 1]})[~collapsed]
+        badges = pd.DataFrame(badges, columns=['x', 'y', 'count'])
+        return pucks, badges
+
+    def cell(self, x, y):
+        return int(math.floor(x / self.spacing)), int(math.floor(y / self.spacing))
+
+    def occupy(self, occupied, x, y):
+        occupied.setdefault(self.cell(x, y), []).append((x, y))
+
+    def collides(self, occupied, x, y):
+        cx, cy = self.cell(x, y)
+        for i in (cx - 1, cx, cx + 1):
+            for j in (cy - 1, cy, cy + 1):
+                for ox, oy in occupied.get((i, j), ()):
+                    if math.hypot(x - ox, y - oy) < self.spacing * 0.999:
+                        return True
+        return False
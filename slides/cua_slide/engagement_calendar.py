@@ -1,130 +1,211 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 from datetime import timedelta
-from graphics.puck import Puck
+from graphics.puck import PuckLayer
+from matplotlib.figure import Figure
+from graphics.render import FigureTemplate, figure_to_buffer, save_figure
+from graphics.text import TextLayout
 from data.server import data_server
+from instrumentation.tracer import traced, tracer
 
 
 class CalendarPlotter:
-    def __init__(self, fiscal_week, output_image='calendar.png'):
-        self.start_date = None
+    def __init__(self, fiscal_week, output_image='calendar.png', engagements=None, start_date=None):
+        self.start_date = start_date
         self.fiscal_week = fiscal_week
         self.server = data_server
         self.output_image = output_image
-        self.engagements = self.load_engagements()
-        self.fig, self.ax = plt.subplots(figsize=(8, 8))
-
-    def load_engagements(self):
-        # Load engagement data from CSV
-        df = self.server.engagements
+        self.engagements = self.load_engagements(engagements)
+        # The figure is only created once something is drawn with matplotlib; native slides never need one
+        self.fig = None
+        self.ax = None
+        self.template = None
+
+    def load_engagements(self, engagements=None):
+        # Load engagement data from CSV, unless an already sliced frame was handed in
+        df = self.server.engagements if engagements is None else engagements.copy()
         df['date'] = pd.to_datetime(df['date'])
-        df['day'] = df['date'].dt.day_name()
         return df
 
+    def get_start_date(self):
+        # Calculate the starting date of the calendar (Monday of the first week), unless one was given
+        if self.start_date is None:
+            min_date = self.engagements['date'].min()
+            self.start_date = min_date - timedelta(days=min_date.weekday())  # Find the Monday of the starting week
+        return self.start_date
+
     @staticmethod
-    def adjust_weekends(day):
-        # Adjust dates falling on weekends
-        if day == 'Saturday':
-            return 'Friday'
-        elif day == 'Sunday':
-            return 'Monday'
-        return day
-
-    def draw_frame(self):
+    def draw_scaffold(ax):
         # Create a 50x40 grid
-        self.ax.set_xticks(range(0, 51, 10))
-        self.ax.set_xticks(range(0, 51), minor=True)
-        self.ax.set_yticks(range(0, 41, 10))
-        self.ax.set_yticks(range(0, 41), minor=True)
-        self.ax.grid(which='major', color='black', linestyle='-', linewidth=1)
+        ax.set_xticks(range(0, 51, 10))
+        ax.set_xticks(range(0, 51), minor=True)
+        ax.set_yticks(range(0, 41, 10))
+        ax.set_yticks(range(0, 41), minor=True)
+        ax.grid(which='major', color='black', linestyle='-', linewidth=1)
 
         # Label the days of the week at intervals of 10
         days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
         for i, day in enumerate(days):
-            self.ax.text(i * 10 + 5, 41, day, ha='center', va='bottom', fontsize=10)
+            ax.text(i * 10 + 5, 41, day, ha='center', va='bottom', fontsize=10)
+
+        ax.set_xlim(0, 50)
+        ax.set_ylim(0, 40)
+        ax.invert_yaxis()
+
+    @classmethod
+    def build_template(cls):
+        fig = Figure(figsize=(8, 8))
+        cls.draw_scaffold(fig.subplots())
+        return fig
+
+    @traced('calendar.frame')
+    def draw_frame(self, reuse=False):
+        # With reuse, the grid and weekday labels come from the process-wide template and only the labels of
+        # this window are drawn; render() or release() hands the template back
+        if reuse:
+            self.template = FigureTemplate.get('calendar', self.build_template)
+            self.fig, self.ax = self.template.fig, self.template.fig.axes[0]
+        else:
+            if self.fig is None:
+                self.fig, self.ax = plt.subplots(figsize=(8, 8))
+            self.draw_scaffold(self.ax)
 
         # Label the weeks at intervals of 10
         for week in range(4):
             this_fiscal_week = week + self.fiscal_week
             self.ax.text(-2, week * 10 + 5, f'Week {this_fiscal_week + 1}', ha='right', va='center', fontsize=10)
 
-        # Calculate the starting date of the calendar (Monday of the first week)
-        min_date = self.engagements['date'].min()
-        self.start_date = min_date - timedelta(days=min_date.weekday())  # Find the Monday of the starting week
-
         # Plot dates
+        start_date = self.get_start_date()
         for week in range(4):
             for day in range(5):
-                current_date = self.start_date + timedelta(days=week * 7 + day)
+                current_date = start_date + timedelta(days=week * 7 + day)
                 date_str = current_date.strftime('%-m.%-d')
                 x_pos = day * 10
                 y_pos = (week * 10) - 9
                 self.ax.text(x_pos + 0.5, y_pos + 9.5, date_str, ha='left', va='top', fontsize=10)
 
-        self.ax.set_xlim(0, 50)
-        self.ax.set_ylim(0, 40)
-        self.ax.invert_yaxis()
+    @traced('calendar.place')
+    def place_engagements(self):
+        # Vectorised placement: one row per engagement with its calendar cell, stacking slot and category number
+        df = self.engagements
+        weekday = df['date'].dt.weekday
+        placement = pd.DataFrame({
+            'week_index': (df['date'] - self.get_start_date()).dt.days // 7,  # Convert date to week index
+            'day_index': weekday.replace({5: 4, 6: 0}),  # Saturdays move to Friday, Sundays to Monday
+            'category': df['category'],
+            'color': df['color'],
+            'engagement': df['engagement'],
+        })
+        placement = placement[(placement['week_index'] >= 0) & (placement['week_index'] < 4)]
+
+        # Cells are numbered in the order they first appear; rows keep their order within a cell
+        cell_order, _ = pd.factorize(placement['week_index'] * 5 + placement['day_index'])
+        placement = placement.assign(cell_order=cell_order).sort_values('cell_order', kind='stable')
+        placement['slot'] = placement.groupby(['week_index', 'day_index'], observed=True).cumcount()
+        placement['number'] = placement.groupby('category', observed=True).cumcount() + 1
+
+        # Puck position; each additional event in a cell moves down by 2
+        placement['x'] = placement['day_index'] * 10 + 1
+        placement['y'] = placement['week_index'] * 10 + 3 + 2 * placement['slot']
+        tracer.count('rows.placed', len(placement))
+        return placement.drop(columns='cell_order').reset_index(drop=True)
 
-    def plot_engagements(self):
-        # Create a dictionary to store the engagements by date
-        engagements_by_date = {}
+    @staticmethod
+    def count_categories(placement):
         category_counters = {'Mil-Mil (US)': 1, 'Mil-Mil (ROK)': 1, 'Civ-Mil': 1}
+        for category, count in placement['category'].value_counts().items():
+            category_counters[category] = category_counters.get(category, 1) + count
+        return category_counters
 
-        # Store each engagement
-        for index, row in self.engagements.iterrows():
-            week_index = (row['date'] - self.start_date).days // 7  # Convert date to week index
-            day = self.adjust_weekends(row['day'])
-            day_index = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'].index(day)  # Convert day to x-index
-
-            if week_index < 4:
-                # Store the engagement in the dictionary
-                date_str = row['date'].strftime('%-m.%-d')
-                if (week_index, day_index) not in engagements_by_date:
-                    engagements_by_date[(week_index, day_index)] = {'date': date_str, 'engagements': []}
-                engagements_by_date[(week_index, day_index)]['engagements'].append(row)
-
-        # Function to wrap text
-        def wrap_text(text, max_length):
-            words = text.split()
-            wrapped_text = ""
-            line = ""
-            for word in words:
-                if len(line) + len(word) + 1 <= max_length:
-                    if line:
-                        line += " "
-                    line += word
-                else:
-                    if wrapped_text:
-                        wrapped_text += "\n"
-                    wrapped_text += line
-                    line = word
-            if line:
-                if wrapped_text:
-                    wrapped_text += "\n"
-                wrapped_text += line
-            return wrapped_text
-
-        # Plot engagements
-        for (week_index, day_index), info in engagements_by_date.items():
-            x_pos = day_index * 10
-            y_pos = (week_index * 10) - 6
-
-            for idx, engagement in enumerate(info['engagements']):
-                y_offset = y_pos + 2 * idx  # Adjust y position by +2 for each additional event
-
-                puck = Puck(x_pos + 1, y_offset + 9, engagement['category'], engagement['color'],
-                            category_counters[engagement['category']], scale=6, font=8)
-                puck.add_to_axes(self.ax)
-                category_counters[engagement['category']] += 1
-
-                # Wrap engagement text to fit within the day cell
-                wrapped_engagement = wrap_text(engagement['engagement'],
-                                               max_length=15)  # Adjust max_length as necessary
-                self.ax.text(x_pos + 2, y_offset + 9, wrapped_engagement, ha='left', va='center', fontsize=8, wrap=True)
+    @traced('calendar.draw')
+    def plot_engagements(self, placement=None):
+        placement = self.place_engagements() if placement is None else placement
+        category_counters = self.count_categories(placement)
+
+        # All pucks are drawn as a handful of collections
+        PuckLayer(placement['x'], placement['y'], placement['category'], placement['color'], placement['number'],
+                  scale=6, font=8).add_to_axes(self.ax)
+
+        # Wrap engagement text to the rest of the day cell, measured in points from the axes size, and cut it
+        # at the two lines that fit between stacked pucks
+        layout = TextLayout(8)
+        points_per_unit = self.ax.get_position().width * self.fig.get_figwidth() * 72 / 50
+        for x, y, day_index, engagement in zip(placement['x'], placement['y'], placement['day_index'],
+                                               placement['engagement']):
+            text = layout.wrap(engagement, (day_index * 10 + 10 - x - 1.5) * points_per_unit, max_lines=2)
+            self.ax.text(x + 1, y, text, ha='left', va='center', fontsize=8)
+        tracer.count('artists.created', len(placement))
 
         return category_counters
 
     def save_calendar(self):
-        plt.savefig(self.output_image, bbox_inches='tight')
-        plt.show()
-
+        save_figure(self.fig, self.output_image)
+        self.release()
+
+    def render(self):
+        # Headless alternative to save_calendar: PNG bytes in memory, figure released afterwards
+        buffer = figure_to_buffer(self.fig, close=False)
+        self.release()
+        return buffer
+
+    def release(self):
+        # Close the figure, or clear a reused template for the next render
+        if self.template is not None:
+            self.template.reset()
+        elif self.fig is not None:
+            plt.close(self.fig)
+        self.fig = self.ax = self.template = None
+
+    @traced('calendar.pptx')
+    def draw_pptx(self, slide, left, top, width, height, font=6):
+        # Native alternative to draw_frame + plot_engagements: the grid, labels, pucks and engagement text become
+        # editable slide shapes, so no figure is drawn at all. Fonts are sized for the 5 inch slide panel.
+        # python-pptx is only imported here, so the matplotlib calendar never loads it
+        from pptx.enum.shapes import MSO_SHAPE
+        from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+        from pptx.util import Inches, Pt
+        from slides.pptx_tools import ShapeBatch, SlideRegion, add_puck, add_textbox, set_line
+
+        batch = ShapeBatch(slide)
+        label_width, label_height = Inches(0.55), Inches(0.25)
+        grid = SlideRegion(left + label_width, top + label_height, width - label_width, height - label_height,
+                           (0, 50), (0, 40), invert_y=True)
+
+        # One outlined cell per day, then day names above and week numbers to the left
+        start_date = self.get_start_date()
+        for week in range(4):
+            for day in range(5):
+                cell = batch.shapes.add_shape(MSO_SHAPE.RECTANGLE, int(grid.x(day * 10)), int(grid.y(week * 10)),
+                                              int(grid.dx(10)), int(grid.dy(10)))
+                cell.shadow.inherit = False
+                cell.fill.background()
+                set_line(cell)
+                current_date = start_date + timedelta(days=week * 7 + day)
+                add_textbox(batch.shapes, grid.x(day * 10 + 0.5), grid.y(week * 10 + 0.5), grid.dx(9), grid.dy(2),
+                            current_date.strftime('%-m.%-d'), font + 1, align=PP_ALIGN.LEFT, anchor=MSO_ANCHOR.TOP)
+        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+        for i, day in enumerate(days):
+            add_textbox(batch.shapes, grid.x(i * 10), top, grid.dx(10), label_height, day, font + 1,
+                        anchor=MSO_ANCHOR.BOTTOM)
+        for week in range(4):
+            add_textbox(batch.shapes, left, grid.y(week * 10), label_width - Inches(0.05), grid.dy(10),
+                        f'Week {week + self.fiscal_week + 1}', font + 1, align=PP_ALIGN.RIGHT)
+
+        # Pucks with their number, and the engagement text wrapped to the rest of the cell. The text is laid out
+        # here rather than left to PowerPoint, so it is cut at the lines that fit instead of running into the
+        # next puck
+        placement = self.place_engagements()
+        layout = TextLayout(font)
+        for row in placement.itertuples(index=False):
+            w, h = PuckLayer.marker_size(row.category, scale=6)
+            add_puck(batch.shapes, PuckLayer.shapes.get(row.category, 'square'), grid.x(row.x), grid.y(row.y),
+                     grid.dx(w), grid.dy(h), row.color, row.number, font - 1, shadow_offset=grid.dx(0.06))
+            text_width, text_height = grid.dx(row.day_index * 10 + 10 - row.x - 1.5), grid.dy(2)
+            text = layout.wrap(row.engagement, text_width / Pt(1),
+                               max_lines=max(int(text_height / Pt(layout.line_height)), 1))
+            add_textbox(batch.shapes, grid.x(row.x + 1), grid.y(row.y - 1), text_width, text_height, text, font,
+                        align=PP_ALIGN.LEFT)
+
+        batch.flush()
+        return self.count_categories(placement)
@@ -1,32 +1,79 @@
-from engagement_calendar import CalendarPlotter
-from map import MapPlotter
+import io
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from slides.cua_slide.engagement_calendar import CalendarPlotter
+from slides.cua_slide.map import MapPlotter
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
-from datetime import datetime
+from datetime import timedelta
 from data.server import data_server
+from graphics.render import write_buffer
+from instrumentation.tracer import traced
+from slides.fiscal import current_fiscal_week
+from slides.pptx_tools import save_presentation
+
+
+# Panels are rendered independently (possibly in worker processes); each returns PNG bytes and its counters
+def render_calendar_panel(fiscal_week, engagements=None, start_date=None):
+    plotter = CalendarPlotter(fiscal_week, engagements=engagements, start_date=start_date)
+    plotter.draw_frame(reuse=True)
+    category_counters = plotter.plot_engagements()
+    return plotter.render().getvalue(), category_counters
+
+
+def render_map_panel(fiscal_week, engagements=None, start_date=None):
+    plotter = MapPlotter(engagements=engagements)
+    image = plotter.render().getvalue()
+    return image, plotter.category_counters
+
+
+PANELS = {'calendar': render_calendar_panel, 'map': render_map_panel}
 
 
 class EngagementsPlotter:
-    def __init__(self, calendar_output='calendar.png', map_output='map.png', ppt_output='engagements.pptx'):
+    def __init__(self, calendar_output='calendar.png', map_output='map.png', ppt_output='engagements.pptx',
+                 fiscal_week=None, unit='2ID/RUCD', engagements=None, start_date=None):
         self.server = data_server
-        self.fiscal_week = self.get_fiscal_week()
-        self.calendar_plotter = CalendarPlotter(self.fiscal_week, calendar_output)
-        self.map_plotter = MapPlotter(map_output)
+        self.fiscal_week = self.get_fiscal_week() if fiscal_week is None else fiscal_week
+        self.unit = unit
+        if engagements is None and start_date is not None:
+            # A known window only needs its own four weeks of rows
+            engagements = self.server.window('engagements', start_date, start_date + timedelta(weeks=4), unit)
+        self.engagements = engagements
+        self.start_date = start_date
+        self.calendar_output = calendar_output
+        self.map_output = map_output
         self.ppt_output = ppt_output
         self.slide = None
+        # Counters of each panel, which mean different things: the calendar's are the next puck number per
+        # category, the map's the number of engagements it shows per category
+        self.panel_counters = {}
+
+    # The plotters (and the data and geometry they load) are only built when this process draws with them;
+    # the parallel path renders both panels in workers and never needs them
+    @cached_property
+    def calendar_plotter(self):
+        return CalendarPlotter(self.fiscal_week, self.calendar_output, self.engagements, self.start_date)
+
+    @cached_property
+    def map_plotter(self):
+        return MapPlotter(self.map_output, self.engagements)
 
     @staticmethod
     def get_fiscal_week():
-        today = datetime.today()
-        fiscal_start = datetime(today.year if today.month >= 10 else today.year - 1, 10, 1)
-        fiscal_week = (today - fiscal_start).days // 7 + 1
-        return fiscal_week
+        return current_fiscal_week()
+
+    @staticmethod
+    def get_title(unit, fiscal_week):
+        return f"{unit} Current Engagements (Week {fiscal_week} to {fiscal_week + 4})"
 
     def add_title(self):
-        fiscal_week = self.get_fiscal_week()
-        title = f"2ID/RUCD Current Engagements (Week {fiscal_week} to {fiscal_week + 4})"
-        title_box = self.slide.shapes.add_textbox(0, 0, width=Inches(10), height=Inches(1.5))
+        self.add_title_box(self.slide, self.get_title(self.unit, self.fiscal_week))
+
+    @staticmethod
+    def add_title_box(slide, title):
+        title_box = slide.shapes.add_textbox(0, 0, width=Inches(10), height=Inches(1.5))
         title_frame = title_box.text_frame
         title_frame.text = title
         title_frame.paragraphs[0].font.size = Pt(30)
@@ -37,27 +84,54 @@ class EngagementsPlotter:
             paragraph.margin_top = 0
             paragraph.margin_bottom = 0
 
-    def create_ppt(self):
-        # Create a PowerPoint presentation
-        prs = Presentation()
-
+    @classmethod
+    def add_slide(cls, prs, title, calendar_image, map_image):
         # Add a slide with title and content layout
         slide_layout = prs.slide_layouts[5]  # Use a blank slide layout
-        self.slide = prs.slides.add_slide(slide_layout)
+        slide = prs.slides.add_slide(slide_layout)
 
         # Add a title to the slide
-        self.add_title()
+        cls.add_title_box(slide, title)
 
         # Add the calendar image at the bottom left corner
-        self.slide.shapes.add_picture(self.calendar_plotter.output_image, Inches(0),
-                                      prs.slide_height - Inches(5), width=Inches(5), height=Inches(5))
+        slide.shapes.add_picture(calendar_image, Inches(0),
+                                 prs.slide_height - Inches(5), width=Inches(5), height=Inches(5))
 
         # Add the map image on the right half
-        self.slide.shapes.add_picture(self.map_plotter.output_image, Inches(5), prs.slide_height - Inches(6),
-                                      width=Inches(5), height=Inches(6))
+        slide.shapes.add_picture(map_image, Inches(5), prs.slide_height - Inches(6),
+                                 width=Inches(5), height=Inches(6))
+        return slide
 
-        # Save the PowerPoint presentation
-        prs.save(self.ppt_output)
+    @staticmethod
+    def add_native_slide(prs, title, calendar_plotter, map_plotter):
+        # Same layout as add_slide, but both panels are drawn as editable shapes instead of pictures
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        EngagementsPlotter.add_title_box(slide, title)
+        category_counters = calendar_plotter.draw_pptx(slide, Inches(0), prs.slide_height - Inches(5), Inches(5),
+                                                       Inches(5))
+        map_plotter.draw_pptx(slide, Inches(5), prs.slide_height - Inches(6), Inches(5), Inches(6))
+        return slide, category_counters
+
+    @traced('deck.native')
+    def create_native_ppt(self):
+        # Vector deck: no calendar figure is drawn and the map only reuses its cached background raster
+        prs = Presentation()
+        self.slide, category_counters = self.add_native_slide(prs, self.get_title(self.unit, self.fiscal_week),
+                                                              self.calendar_plotter, self.map_plotter)
+        save_presentation(prs, self.ppt_output)
+        return category_counters
+
+    def create_ppt(self, calendar_image=None, map_image=None):
+        # Images may be file paths or in-memory buffers; default to the images written by plot_and_save_all
+        calendar_image = calendar_image or self.calendar_output
+        map_image = map_image or self.map_output
+
+        # Create a PowerPoint presentation
+        prs = Presentation()
+        self.slide = self.add_slide(prs, self.get_title(self.unit, self.fiscal_week), calendar_image, map_image)
+
+        # Save the PowerPoint presentation (a path or a file-like object)
+        save_presentation(prs, self.ppt_output)
 
     def plot_and_save_all(self):
         self.calendar_plotter.draw_frame()
@@ -67,8 +141,68 @@ class EngagementsPlotter:
         self.create_ppt()
         return category_counters
 
+    @traced('deck.render')
+    def render_all(self, save_images=False, parallel=False, workers=None):
+        # Headless pipeline: figures go straight into memory buffers and are closed, no plt.show() stalls.
+        # The PNGs are only written to disk when save_images is set
+        if parallel:
+            images = self.render_panels(workers)
+            calendar_image, map_image = images['calendar'], images['map']
+        else:
+            self.calendar_plotter.draw_frame(reuse=True)
+            calendar_counters = self.calendar_plotter.plot_engagements()
+            calendar_image = self.calendar_plotter.render()
+            map_image = self.map_plotter.render()
+            self.panel_counters = {'calendar': calendar_counters, 'map': self.map_plotter.category_counters}
+        if save_images:
+            write_buffer(calendar_image, self.calendar_output)
+            write_buffer(map_image, self.map_output)
+        self.create_ppt(calendar_image, map_image)
+        return self.panel_counters
+
+    @traced('deck.build')
+    def build(self, manifest):
+        # Incremental render: panels whose rows and parameters are unchanged are reused from disk,
+        # and the deck is only reassembled when one of its panels changed
+        calendar = self.calendar_plotter
+        calendar_fingerprint = manifest.fingerprint(calendar.engagements, fiscal_week=self.fiscal_week,
+                                                    start_date=calendar.get_start_date())
+        map_fingerprint = manifest.fingerprint(self.map_plotter.engagements,
+                                               extent=self.map_plotter.extent,
+                                               basemap=self.map_plotter.get_basemap().key)
+        deck_fingerprint = manifest.fingerprint(calendar=calendar_fingerprint, map=map_fingerprint,
+                                                title=self.get_title(self.unit, self.fiscal_week))
+
+        rebuilt = []
+        if not manifest.is_fresh(calendar.output_image, calendar_fingerprint):
+            calendar.draw_frame(reuse=True)
+            calendar.plot_engagements()
+            write_buffer(calendar.render(), calendar.output_image)
+            manifest.record(calendar.output_image, calendar_fingerprint)
+            rebuilt.append(calendar.output_image)
+        if not manifest.is_fresh(self.map_plotter.output_image, map_fingerprint):
+            write_buffer(self.map_plotter.render(), self.map_plotter.output_image)
+            manifest.record(self.map_plotter.output_image, map_fingerprint)
+            rebuilt.append(self.map_plotter.output_image)
+        if rebuilt or not manifest.is_fresh(self.ppt_output, deck_fingerprint):
+            self.create_ppt()
+            manifest.record(self.ppt_output, deck_fingerprint)
+            rebuilt.append(self.ppt_output)
+        return rebuilt
+
+    def render_panels(self, workers=None):
+        # Render every panel in its own process; wall-clock time is that of the slowest panel
+        with ProcessPoolExecutor(max_workers=workers or len(PANELS)) as pool:
+            futures = {name: pool.submit(panel, self.fiscal_week, self.engagements, self.start_date)
+                       for name, panel in PANELS.items()}
+            results = {name: future.result() for name, future in futures.items()}
+
+        self.panel_counters = {name: counters for name, (_, counters) in results.items()}
+        return {name: io.BytesIO(image) for name, (image, _) in results.items()}
+
 
-# Example usage
-plotter = EngagementsPlotter()
-category_counts = plotter.plot_and_save_all()
-print(category_counts)
+if __name__ == '__main__':
+    # Example usage
+    plotter = EngagementsPlotter()
+    category_counts = plotter.plot_and_save_all()
+    print(category_counts)
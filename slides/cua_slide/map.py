@@ -1,37 +1,54 @@
-import geopandas as gpd
+import os
+import numpy as np
+import pandas as pd
+import shapely
 import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
 import matplotlib.patches as mpatches
 import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-from graphics.puck import Puck
+from graphics.puck import Puck, PuckLayer
+from graphics.basemap import Basemap
+from matplotlib.figure import Figure
+from graphics.render import FigureTemplate, figure_to_buffer, save_figure
+from data.geometry import GeometryProvider
+from data.regions import RegionIndex, province_geometry
+from data.schema import BaseIndex
 from data.server import map_server
+from instrumentation.tracer import traced, tracer
+from slides.cua_slide.decluster import Declusterer
 
 
 class MapPlotter:
-    def __init__(self, output_image='map.png'):
+    extent = [124, 131, 33, 39]
+    figsize = (10, 12)
+    # 'pucks' draws every engagement; 'regions' shades each province by its number of engagements
+    modes = ('pucks', 'regions')
+    regions = province_geometry
+
+    def __init__(self, output_image='map.png', engagements=None):
         self.server = map_server
         self.output_image = output_image
-        self.gdf = self.load_data()
+        self.engagements = self.load_data(engagements)
         self.category_counters = {'Mil-Mil (US)': 0, 'Mil-Mil (ROK)': 0, 'Civ-Mil': 0}
+        self.declusterer = Declusterer()
 
-    def load_data(self):
-        # Load base location data from
-        bases_df = self.server.bases
-        engagements_df = self.server.engagements
-
-        # Merge engagements with base locations on the base name
-        merged_df = engagements_df.merge(bases_df, left_on='location', right_on='name', how='left')
-
-        if 'longitude' not in merged_df.columns or 'latitude' not in merged_df.columns:
-            raise KeyError("The merged DataFrame must contain 'longitude' and 'latitude' columns.")
+    @classmethod
+    def get_basemap(cls, dpi=None):
+        return Basemap(cls.extent, figsize=cls.figsize, dpi=dpi or plt.rcParams['figure.dpi'])
 
-        # Convert the DataFrame to a GeoDataFrame
-        gdf = gpd.GeoDataFrame(merged_df, geometry=gpd.points_from_xy(merged_df['longitude'], merged_df['latitude']))
-        gdf.set_crs(epsg=4326, inplace=True)
-        return gdf
+    @traced('map.load_data')
+    def load_data(self, engagements=None):
+        # Engagements (optionally an already sliced frame) with the id and coordinates of their base. Locations
+        # are resolved against the base coordinate array; unknown locations get NaN coordinates
+        engagements_df = self.server.engagements if engagements is None else engagements
+        bases = BaseIndex(self.server.bases)
+        base_ids = bases.resolve(engagements_df['location'])
+        longitude, latitude = bases.lookup(base_ids)
+        return engagements_df.assign(base_id=base_ids, longitude=longitude, latitude=latitude)
 
     def plot_legend(self, ax, scale=3):
-        # Add legend at the top of the map
+        # Add legend at the top of the map, with the counters of the placement drawn with it (place_pucks or
+        # aggregate_regions)
         legend_x_start = 124.5
         legend_y = 38.8  # Adjust y position for the legend
         categories = ['Mil-Mil (US)', 'Mil-Mil (ROK)', 'Civ-Mil']
@@ -54,55 +71,194 @@ class MapPlotter:
             puck.add_to_axes(ax)
             ax.text(x + 0.4 * scale, y, category, ha='left', va='center', fontsize=16, zorder=50)
 
-    def plot_map(self):
-        # Create the plot with cartopy
-        fig, ax = plt.subplots(figsize=(10, 12), subplot_kw={'projection': ccrs.PlateCarree()})
-        ax.set_extent([124, 131, 33, 39], crs=ccrs.PlateCarree())
-
-        # Add detailed coastlines
-        ax.add_feature(cfeature.COASTLINE.with_scale('10m'), linewidth=1)
-        ax.add_feature(cfeature.BORDERS.with_scale('10m'), linestyle=':')
-
-        # Color the map regions
-        ax.add_feature(cfeature.OCEAN, facecolor='lightgrey')
-        ax.add_feature(cfeature.LAND, facecolor='lightgrey')
-        ax.add_feature(cfeature.LAKES, facecolor='white')
-        ax.add_feature(cfeature.RIVERS, edgecolor='blue')
-
-        # Color South Korea and North Korea
-        countries = self.server.countries # gpd.read_file('../data/10m_cultural/ne_10m_admin_0_countries_usa.shp')
-        rok = countries[countries['ADM0_A3_US'] == 'KOR']
-        nk = countries[countries['ADM0_A3_US'] == 'PRK']
-        jpn = countries[countries['ADM0_A3_US'] == 'JPN']
-        rok.plot(ax=ax, facecolor='lightblue')
-        nk.plot(ax=ax, facecolor='red')
-        jpn.plot(ax=ax, facecolor='white')
-
-        # Plot the GeoDataFrame
-        offset_dict = {}
-
-        for idx, row in self.gdf.iterrows():
-            location = (row.geometry.x, row.geometry.y)
-            category = row['category']
-            self.category_counters[category] += 1
-            if location not in offset_dict:
-                offset_dict[location] = []
-            offset_dict[location].append((idx, self.category_counters[category], row))
-
-        for location, items in offset_dict.items():
-            base_x, base_y = location
-            for i, (idx, num, row) in enumerate(items):
-                x_offset = (i % 3) * 0.2  # Adjust offset as necessary
-                y_offset = (i // 3) * 0.2  # Adjust offset as necessary
-                x = base_x + x_offset
-                y = base_y + y_offset
-
-                puck = Puck(x, y, row['category'], row['color'], num, scale=1)
-                puck.add_to_axes(ax)
+    @staticmethod
+    def plot_badges(ax, badges, zorder=20):
+        # One disc per collapsed cluster showing how many engagements it holds. Sized in points so it stays
+        # round whatever the map aspect
+        if badges.empty:
+            return
+        sizes = (14 + 6 * badges['count'].astype(str).str.len()) ** 2
+        ax.scatter(badges['x'], badges['y'], s=sizes, c='dimgrey', edgecolors='black', linewidths=1, zorder=zorder)
+        for x, y, count in zip(badges['x'], badges['y'], badges['count']):
+            ax.text(x, y, str(count), fontsize=10, ha='center', va='center', color='white', fontweight='bold',
+                    zorder=zorder + 1)
+
+    @traced('map.place')
+    def place_pucks(self):
+        # Returns (pucks, badges): the engagements drawn individually with their display position and number,
+        # and the crowded spots collapsed into a count badge. Pucks are numbered per category in row order
+        numbers = self.engagements.groupby('category', observed=True).cumcount() + 1
+        for category, count in self.engagements['category'].value_counts().items():
+            self.category_counters[category] = count
+
+        # Spread pucks around their bases without overlaps
+        located = self.engagements[self.engagements['base_id'] >= 0]
+        positions, badges = self.declusterer.place(located['longitude'].values, located['latitude'].values)
+        rows = located.iloc[positions.index]
+        pucks = pd.DataFrame({'x': positions['x'].values, 'y': positions['y'].values,
+                              'category': rows['category'].values, 'color': rows['color'].values,
+                              'number': numbers.loc[rows.index].values})
+        tracer.count('rows.placed', len(located))
+        return pucks, badges
+
+    @traced('map.aggregate')
+    def aggregate_regions(self):
+        # The regions inside the map extent with their engagement counts per category and in total. Engagements
+        # are located in the full-detail polygons; unknown locations and points outside every region are not
+        # counted, neither on the map nor in the legend
+        if not self.regions.available():
+            raise FileNotFoundError(f"The regions map mode needs the Natural Earth layer "
+                                    f"'{os.path.basename(self.regions.path)}', which is missing from "
+                                    f"{os.path.dirname(self.regions.path)}")
+        index = RegionIndex(self.regions.load(self.extent))
+        counts = index.count(index.locate(self.engagements['longitude'], self.engagements['latitude']),
+                             self.engagements['category'])
+        for category in counts.columns.drop('total'):
+            self.category_counters[category] = int(counts[category].sum())
+        return index.regions.join(counts)
+
+    def shade_regions(self, summary, dpi=None, cmap='YlOrRd'):
+        # The regions with engagements and their fill colours by total. Outlines are simplified to the level of
+        # detail of the basemap
+        shaded = summary[summary['total'] > 0]
+        if shaded.empty:
+            return shaded, []
+        shaded = GeometryProvider.simplify(shaded, self.get_basemap(dpi).lod.tolerance)
+        return shaded, plt.get_cmap(cmap)(mcolors.Normalize(0, shaded['total'].max())(shaded['total']))
+
+    def plot_regions(self, ax, summary, zorder=10):
+        # Shade the regions with engagements by their total and print the total inside each
+        shaded, colors = self.shade_regions(summary, ax.figure.dpi)
+        if shaded.empty:
+            return
+        # aspect=None keeps the aspect of the basemap layout; geopandas would otherwise set its own
+        shaded.plot(ax=ax, color=colors, edgecolor='black', linewidth=0.5, alpha=0.8, zorder=zorder, aspect=None)
+        for point, total in zip(shaded.geometry.representative_point(), shaded['total']):
+            ax.text(point.x, point.y, str(total), fontsize=10, ha='center', va='center', fontweight='bold',
+                    zorder=zorder + 1)
+        tracer.count('artists.created', len(shaded))
+
+    @classmethod
+    def check_mode(cls, mode):
+        if mode not in cls.modes:
+            raise ValueError(f"Unknown map mode '{mode}'. Available modes: {', '.join(cls.modes)}")
+
+    def draw_background(self, ax, use_cache=True):
+        # The static background (coastlines, borders, water, country fills) is rendered once and reused
+        basemap = self.get_basemap(ax.figure.dpi)
+        if use_cache:
+            basemap.draw(ax)
+        else:
+            basemap.draw_layers(ax)
+
+    def build_template(self, use_cache=True):
+        fig = Figure(figsize=self.figsize)
+        self.draw_background(fig.add_subplot(projection=ccrs.PlateCarree()), use_cache)
+        return fig
+
+    @traced('map.draw')
+    def draw_map(self, use_cache=True, placement=None, template=None, mode='pucks'):
+        # Draws onto a new figure, or only the pucks, badges and legend onto a template holding the background.
+        # placement is the result of place_pucks, or of aggregate_regions in 'regions' mode
+        self.check_mode(mode)
+        if template is None:
+            fig, ax = plt.subplots(figsize=self.figsize, subplot_kw={'projection': ccrs.PlateCarree()})
+            self.draw_background(ax, use_cache)
+        else:
+            fig, ax = template.fig, template.fig.axes[0]
+
+        if mode == 'regions':
+            self.plot_regions(ax, self.aggregate_regions() if placement is None else placement)
+        else:
+            rows, badges = self.place_pucks() if placement is None else placement
+            PuckLayer(rows['x'], rows['y'], rows['category'], rows['color'], rows['number'],
+                      scale=1).add_to_axes(ax)
+            self.plot_badges(ax, badges)
 
         # Add legend
         self.plot_legend(ax, scale=1)
+        return fig
+
+    def plot_map(self, use_cache=True, mode='pucks'):
+        fig = self.draw_map(use_cache, mode=mode)
 
         # Save the plot as an image
-        plt.savefig(self.output_image, bbox_inches='tight')
-        plt.show()
+        save_figure(fig, self.output_image)
+        plt.close(fig)
+
+    def render(self, use_cache=True, reuse=True, mode='pucks'):
+        # Headless alternative to plot_map: PNG bytes in memory. With reuse the background figure is kept for the
+        # next render in this process, otherwise the figure is closed
+        if not reuse:
+            return figure_to_buffer(self.draw_map(use_cache, mode=mode))
+        template = FigureTemplate.get(('map', self.figsize, use_cache, mode), lambda: self.build_template(use_cache))
+        self.draw_map(use_cache, template=template, mode=mode)
+        return template.render()
+
+    @traced('map.pptx')
+    def draw_pptx(self, slide, left, top, width, height, mode='pucks'):
+        # Native alternative to draw_map: the cached basemap raster as a picture, with the pucks and badges (or the
+        # shaded regions) and the legend overlaid as editable shapes. python-pptx is only imported here, so the
+        # matplotlib map never loads it
+        from pptx.enum.shapes import MSO_SHAPE
+        from pptx.enum.text import PP_ALIGN
+        from pptx.util import Pt
+        from slides.pptx_tools import (ShapeBatch, SlideRegion, add_marker, add_polygon, add_puck, add_textbox,
+                                       set_fill, set_line, set_text)
+
+        self.check_mode(mode)
+        basemap = self.get_basemap()
+        basemap.load()
+        xlim, ylim = basemap.layout['xlim'], basemap.layout['ylim']
+
+        # Fit the raster into the panel without distorting it, anchored at the top
+        image_height, image_width = basemap.image.shape[:2]
+        fit = min(width / image_width, height / image_height)
+        region = SlideRegion(left + (width - image_width * fit) / 2, top, image_width * fit, image_height * fit,
+                             xlim, ylim)
+        slide.shapes.add_picture(basemap.path, region.left, region.top, region.width, region.height)
+        batch = ShapeBatch(slide)
+
+        if mode == 'regions':
+            shaded, colors = self.shade_regions(self.aggregate_regions())
+            for geometry, total, color in zip(shaded.geometry, shaded['total'], colors):
+                rings = [np.asarray(ring.coords) for polygon in shapely.get_parts(geometry)
+                         for ring in (polygon.exterior, *polygon.interiors)]
+                outline = add_polygon(batch.shapes, [np.column_stack([region.x(ring[:, 0]), region.y(ring[:, 1])])
+                                                     for ring in rings])
+                set_fill(outline, color, alpha=0.8)
+                set_line(outline, width=0.5)
+                point = geometry.representative_point()
+                add_textbox(batch.shapes, region.x(point.x) - Pt(10), region.y(point.y) - Pt(5), Pt(20), Pt(10), total,
+                            7, bold=True)
+        else:
+            pucks, badges = self.place_pucks()
+            for row in pucks.itertuples(index=False):
+                w, h = PuckLayer.marker_size(row.category)
+                add_puck(batch.shapes, PuckLayer.shapes.get(row.category, 'square'), region.x(row.x),
+                         region.y(row.y), region.dx(w), region.dy(h), row.color, row.number, 7,
+                         shadow_offset=region.dx(0.01))
+            for row in badges.itertuples(index=False):
+                size = Pt(7 + 3 * len(str(row.count)))
+                badge = add_marker(batch.shapes, 'circle', region.x(row.x), region.y(row.y), size, size)
+                set_fill(badge, 'dimgrey')
+                set_line(badge)
+                set_text(badge, row.count, 7, color='white', bold=True)
+
+        # Legend along the top edge of the map
+        legend = batch.shapes.add_shape(MSO_SHAPE.RECTANGLE, region.left + region.dx(0.5),
+                                        region.top + region.dy(0.1), region.width - region.dx(1), region.dy(0.4))
+        legend.shadow.inherit = False
+        set_fill(legend, 'white')
+        set_line(legend)
+        categories = ['Mil-Mil (US)', 'Mil-Mil (ROK)', 'Civ-Mil']
+        step = (legend.width - region.dx(0.5)) / len(categories)
+        cy = legend.top + legend.height / 2
+        for i, category in enumerate(categories):
+            cx = legend.left + region.dx(0.35) + i * step
+            w, h = PuckLayer.marker_size(category)
+            add_puck(batch.shapes, PuckLayer.shapes.get(category, 'square'), cx, cy, region.dx(w), region.dy(h),
+                     'grey', self.category_counters.get(category, 0), 7)
+            add_textbox(batch.shapes, cx + region.dx(0.2), legend.top, step - region.dx(0.3), legend.height, category,
+                        10, align=PP_ALIGN.LEFT)
+        batch.flush()
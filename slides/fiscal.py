@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+import pandas as pd
+from data.server import data_server
+
+
+def current_fiscal_year(today=None):
+    # Fiscal year N runs from 1 October of year N - 1
+    today = today or datetime.today()
+    return today.year + 1 if today.month >= 10 else today.year
+
+
+def current_fiscal_week(today=None):
+    today = today or datetime.today()
+    fiscal_start = datetime(today.year if today.month >= 10 else today.year - 1, 10, 1)
+    return (today - fiscal_start).days // 7 + 1
+
+
+def fiscal_week_start(fiscal_week, fiscal_year):
+    # Monday of the calendar week holding the first day of the fiscal week
+    week_start = datetime(fiscal_year - 1, 10, 1) + timedelta(days=(fiscal_week - 1) * 7)
+    return pd.Timestamp(week_start - timedelta(days=week_start.weekday()))
+
+
+def select_window(fiscal_week=None, fiscal_year=None, unit='2ID/RUCD'):
+    # A fiscal week selects that four-week window of the unit, in the given (default: current) fiscal year.
+    # Without one the whole engagement file is shown. Returns (fiscal_week, engagements, start_date)
+    if fiscal_week is None:
+        return current_fiscal_week(), None, None
+    start_date = fiscal_week_start(fiscal_week, fiscal_year or current_fiscal_year())
+    engagements = data_server.window('engagements', start_date, start_date + timedelta(weeks=4), unit)
+    return fiscal_week, engagements, start_date
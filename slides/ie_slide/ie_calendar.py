@@ -1,98 +1,139 @@
+import warnings
 import matplotlib.pyplot as plt
 import pandas as pd
 from datetime import datetime, timedelta
 import matplotlib.dates as mdates
-from graphics.puck import IEPuck
+from graphics.puck import IEPuckLayer
+from matplotlib.figure import Figure
+from graphics.render import FigureTemplate, figure_to_buffer, save_figure, write_buffer
+from graphics.text import TextLayout
+from slides.ie_slide.layout import LaneLayout
+from data.schema import IE_CATEGORIES, STATUSES
 from data.server import data_server
+from instrumentation.tracer import traced, tracer
 
 
 class InformationEnvironmentGenerator:
+    # Pucks are drawn with scale=14, i.e. about 1.7 days across; labels start 2 days after the puck
+    puck_radius = 1.7
+    label_offset = 2
+    figsize = (15, 8)
+
+    # Category rows of the chart, from the bottom up, with the upper bound of each band
+    y_labels = IE_CATEGORIES
+    y_bounds = {'Civilian': 16, 'Military': 42, 'DIV': 50, '8A': 58, 'Higher': 66, 'Holidays': 74}
+
     def __init__(self, output_image='90-day-information-env.png'):
-        self.engagements = None
+        self.overflow = None
+        self.server = data_server
         self.today = datetime.today()
         self.output_image = output_image
-        self.load_engagements()
 
-    def load_engagements(self):
-        # Load engagement data using data_server
-        self.engagements = data_server.engagements90
-        self.engagements['date'] = pd.to_datetime(self.engagements['date'])  # Ensure date is in datetime format
-
-    def plot_engagement_chart(self):
+    def get_window(self):
         # Calculate the current date and the end date (three months from now)
         start_date = self.today.replace(day=1)
         if self.today.day > (datetime(self.today.year, self.today.month + 1, 1) - timedelta(days=1)).day - 7:
             start_date = (start_date + timedelta(days=31)).replace(day=1)
         end_date = start_date + timedelta(days=90)
+        return start_date, end_date
+
+    def filter_engagements(self, start_date, end_date):
+        # Only the engagements within the date range (end day included) are read, with dates already parsed
+        end = pd.Timestamp(end_date).normalize() + timedelta(days=1)
+        return self.server.window('engagements90', start_date, end)
+
+    def days_per_inch(self, start_date, end_date):
+        # Scale of the time axis, from the default subplot margins the chart is drawn with
+        axes_width = plt.rcParams['figure.subplot.right'] - plt.rcParams['figure.subplot.left']
+        return (end_date - start_date).days / (axes_width * self.figsize[0])
+
+    @traced('ie.place')
+    def place_engagements(self, df_filtered, start_date, end_date):
+        # Give every engagement a lane in its category band; the puck and its label must not collide with
+        # anything else in the lane along the time axis. Returns the lane placement aligned with the rows
+        x = mdates.date2num(df_filtered['date'])
+        # Label widths from the glyph metrics of the label font, in points and then in days
+        label_widths = TextLayout(8).widths(df_filtered['engagement']) / 72 * self.days_per_inch(start_date, end_date)
+        bands = {label: (0 if i == 0 else self.y_bounds[self.y_labels[i - 1]], self.y_bounds[label])
+                 for i, label in enumerate(self.y_labels)}
+        placement = LaneLayout(bands).assign(df_filtered['category'], x - self.puck_radius,
+                                             x + self.label_offset + label_widths)
+        self.overflow = df_filtered[placement['overflow'].values]
+        tracer.count('rows.placed', len(placement))
+        if len(self.overflow):
+            warnings.warn(f'{len(self.overflow)} engagements did not fit in their category lanes: '
+                          f'{", ".join(self.overflow["engagement"])}')
+        return placement
+
+    def draw_scaffold(self, ax):
+        # Category band boundaries and grid; the same for every window
+        ax.set_yticks(list(self.y_bounds.values()), minor=False)
+        ax.grid(which='major', linestyle='--', linewidth=0.5)
+        ax.set_ylim(0, max(self.y_bounds.values()) + 5)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+
+    def build_template(self):
+        fig = Figure(figsize=self.figsize)
+        self.draw_scaffold(fig.subplots())
+        return fig
 
-        # Filter engagements within the date range
-        df_filtered = self.engagements[
-            (self.engagements['date'] >= start_date) & (self.engagements['date'] <= end_date)]
+    @traced('ie.draw')
+    def draw_chart(self, engagements=None, placement=None, template=None):
+        # engagements and placement default to the rows of the current window and their lane placement. Draws
+        # onto a new figure, or only what depends on the window onto a template holding the scaffolding
+        start_date, end_date = self.get_window()
+        df_filtered = self.filter_engagements(start_date, end_date) if engagements is None else engagements
+        if placement is None:
+            placement = self.place_engagements(df_filtered, start_date, end_date)
 
         # Define the rows for the y-axis
-        y_labels = ['Civilian', 'Military', 'DIV', '8A', 'Higher', 'Holidays']
-        y_bounds = {'Civilian': 16, 'Military': 42, 'DIV': 50, '8A': 58, 'Higher': 66, 'Holidays': 74}
+        y_labels = self.y_labels
+        y_bounds = self.y_bounds
         y_mapping = {label: y_bounds[label] - (y_bounds[label] - (0 if i == 0 else list(y_bounds.values())[i - 1])) / 2
                      for i, label in enumerate(y_labels)}
 
         # Create the plot
-        fig, ax = plt.subplots(figsize=(15, 8))
+        if template is None:
+            fig, ax = plt.subplots(figsize=self.figsize)
+            self.draw_scaffold(ax)
+        else:
+            fig, ax = template.fig, template.fig.axes[0]
 
-        # Set major and minor ticks for grid lines
+        # Set major ticks for grid lines
         ax.set_xticks(pd.date_range(start=start_date, end=end_date, freq='W-MON'), minor=False)
-        ax.set_yticks(list(y_bounds.values()), minor=False)
-        ax.grid(which='major', linestyle='--', linewidth=0.5)
 
         # Label the y-axis with vertical text
         for label, y in y_mapping.items():
             ax.text(start_date - timedelta(days=5), y, label, va='center', ha='center', rotation=45, fontsize=10, color='black')
 
-        # Adjust plotting area to avoid plotting directly on the lines
-        ax.set_ylim(0, max(y_bounds.values()) + 5)
-
-        # Create dictionaries to store the counts for each category and status
-        counts = {label: 0 for label in y_labels}
-        total_counts = {'in planning': 0, 'for approval': 0, 'approved': 0}
-        status_counts = {'in planning': 0, 'for approval': 0, 'approved': 0}
-
-        status_mapping = {0: 'in planning', 1: 'for approval', 2: 'approved'}
-        color_mapping = {'in planning': 'brown', 'for approval': 'darkorange', 'approved': 'green'}
-
-        # Plot each engagement
-        for idx, row in df_filtered.iterrows():
-            date = mdates.date2num(row['date'])  # Convert date to numerical value
-            category = row['category']
-            engagement_type = row['type']
-            engagement = row['engagement']
-            status = status_mapping[row['status']]
-
-            y_base = y_bounds[category]  # Base y position for the category
-            i = counts[category]
-
-            # Determine the vertical position for the engagement
-            y = y_base - 1.5 - (i * 3)
-            if y <= (0 if list(y_bounds.values())[0] == y_base else y_bounds[
-                list(y_bounds.keys())[list(y_bounds.values()).index(y_base) - 1]]):
-                counts[category] = 0
-                y = y_base - 1.5 - (counts[category] * 3)
-
-            # Update count
-            counts[category] += 1
-            total_counts[status] += 1
-            status_counts[status] += 1
-
-            x = date
-            puck = IEPuck(x, y, engagement_type, status_counts[status], approved=row['status'], scale=14)
-            puck.add_to_axes(ax)
-            ax.text(x + 2, y, engagement, fontsize=8, ha='left', va='center', color='black', wrap=True)
+        # Count the engagements per status; pucks are numbered per status in row order
+        total_counts = {status: 0 for status in STATUSES.values()}
+        for code, count in df_filtered['status'].value_counts().items():
+            total_counts[STATUSES[code]] = count
+        status_numbers = df_filtered.groupby('status').cumcount() + 1
+
+        x = mdates.date2num(df_filtered['date'])
+        y = placement['y'].values
+        pucks = {'x': x, 'y': y, 'category': df_filtered['type'], 'number': status_numbers,
+                 'approved': df_filtered['status']}
+        # Labels running past the end of the window are cut with an ellipsis at the right edge of the axes
+        layout = TextLayout(8)
+        points_per_day = 72 / self.days_per_inch(start_date, end_date)
+        x_end = mdates.date2num(end_date)
+        for label_x, label_y, engagement in zip(x, y, df_filtered['engagement']):
+            label = layout.truncate(engagement, (x_end - label_x - self.label_offset) * points_per_day)
+            ax.text(label_x + self.label_offset, label_y, label, fontsize=8, ha='left', va='center', color='black')
+        tracer.count('artists.created', len(df_filtered))
+
+        # All pucks are drawn as a handful of collections
+        IEPuckLayer(**pucks, scale=14).add_to_axes(ax)
 
         # Set x and y axis labels and limits
         ax.set_xlim(start_date, end_date)
         ax.set_ylim(0, max(y_bounds.values()) + 5)
 
-        # Add gridlines and format the x-axis for dates
+        # Add gridlines and slant the dates
         ax.grid(True, which='major', linestyle='--', linewidth=0.5)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
         fig.autofmt_xdate()
 
         # Add title to the graph
@@ -109,11 +150,37 @@ class InformationEnvironmentGenerator:
         ]
         ax.legend(handles=legend_elements, loc='lower center', bbox_to_anchor=(0.5, -0.2), ncol=3, fontsize=10)
 
-        # Save the plot as an image
-        plt.savefig(self.output_image, bbox_inches='tight')
-        plt.show()
+        return fig
 
+    def plot_engagement_chart(self):
+        fig = self.draw_chart()
 
-# Example usage
-generator = InformationEnvironmentGenerator()
-generator.plot_engagement_chart()
+        # Save the plot as an image
+        save_figure(fig, self.output_image)
+        plt.close(fig)
+
+    def render(self, reuse=True):
+        # Headless alternative to plot_engagement_chart: PNG bytes in memory. With reuse the scaffolding is kept
+        # for the next render in this process, otherwise the figure is closed
+        if not reuse:
+            return figure_to_buffer(self.draw_chart())
+        template = FigureTemplate.get(('ie', self.figsize), self.build_template)
+        self.draw_chart(template=template)
+        return template.render()
+
+    def build(self, manifest):
+        # Incremental render: the chart is only redrawn when the rows in its window (or the window) changed
+        start_date, end_date = self.get_window()
+        fingerprint = manifest.fingerprint(self.filter_engagements(start_date, end_date),
+                                           start_date=start_date.date(), end_date=end_date.date())
+        if manifest.is_fresh(self.output_image, fingerprint):
+            return []
+        write_buffer(self.render(), self.output_image)
+        manifest.record(self.output_image, fingerprint)
+        return [self.output_image]
+
+
+if __name__ == '__main__':
+    # Example usage
+    generator = InformationEnvironmentGenerator()
+    generator.plot_engagement_chart()
@@ -0,0 +1,57 @@
+import heapq
+import numpy as np
+import pandas as pd
+
+
+class LaneLayout:
+    # Packs labelled items into horizontal lanes inside their category band so that no two items in a lane
+    # overlap along the time axis (greedy interval partitioning, O(n log n) per band)
+    def __init__(self, bands, lane_height=3, margin=1.5):
+        # bands maps a category to its (lower, upper) y bounds; lanes fill downwards from the upper bound
+        self.bands = bands
+        self.lane_height = lane_height
+        self.margin = margin
+
+    def lane_count(self, category):
+        lower, upper = self.bands[category]
+        return max(int((upper - lower) // self.lane_height), 1)
+
+    def lane_y(self, category, lane):
+        return self.bands[category][1] - self.margin - lane * self.lane_height
+
+    @staticmethod
+    def pack(starts, ends, lanes):
+        # Every item takes the lowest lane that is free at its start. When every lane is still busy the item
+        # shares the lane that frees up first and is flagged as overflowing
+        order = np.argsort(starts, kind='stable')
+        assigned = np.zeros(len(starts), dtype=int)
+        overflow = np.zeros(len(starts), dtype=bool)
+        free = list(range(lanes))
+        busy = []  # (end, lane)
+        for i in order:
+            while busy and busy[0][0] <= starts[i]:
+                heapq.heappush(free, heapq.heappop(busy)[1])
+            if free:
+                lane = heapq.heappop(free)
+                heapq.heappush(busy, (ends[i], lane))
+            else:
+                end, lane = busy[0]
+                heapq.heapreplace(busy, (max(end, ends[i]), lane))
+                overflow[i] = True
+            assigned[i] = lane
+        return assigned, overflow
+
+    def assign(self, categories, starts, ends):
+        # Returns a frame (aligned with the inputs) with each item's lane, y position and overflow flag
+        categories = pd.Series(np.asarray(categories, dtype=object))
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        result = pd.DataFrame({'category': categories, 'lane': 0, 'y': 0.0, 'overflow': False})
+
+        for category, index in categories.groupby(categories).groups.items():
+            index = np.asarray(index)
+            lanes, overflow = self.pack(starts[index], ends[index], self.lane_count(category))
+            result.loc[index, 'lane'] = lanes
+            result.loc[index, 'y'] = self.lane_y(category, lanes)
+            result.loc[index, 'overflow'] = overflow
+        return result
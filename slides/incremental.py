@@ -0,0 +1,46 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from graphics.render import atomic_path
+
+# Bump to invalidate every recorded fingerprint after a change to how artifacts are drawn
+BUILD_VERSION = 1
+
+
+class BuildManifest:
+    # Remembers the fingerprint of the inputs behind each generated artifact, so unchanged ones can be reused
+    def __init__(self, path='build_manifest.json'):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def fingerprint(frame=None, **params):
+        # Hash of the rows (values and column names) plus the render parameters
+        digest = hashlib.sha256(str(BUILD_VERSION).encode())
+        if frame is not None:
+            digest.update(json.dumps([str(column) for column in frame.columns]).encode())
+            digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def row_fingerprints(frame, **params):
+        # One fingerprint per row, e.g. one per concept slide
+        suffix = json.dumps(params, sort_keys=True, default=str)
+        row_hashes = pd.util.hash_pandas_object(frame, index=False)
+        return [hashlib.sha256(f'{BUILD_VERSION}:{value:016x}:{suffix}'.encode()).hexdigest()
+                for value in row_hashes]
+
+    def is_fresh(self, artifact, fingerprint):
+        return self.entries.get(artifact) == fingerprint and os.path.exists(artifact)
+
+    def record(self, artifact, fingerprint):
+        self.entries[artifact] = fingerprint
+
+    def save(self):
+        with atomic_path(self.path) as temp, open(temp, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
@@ -0,0 +1,205 @@
+import copy
+import io
+import os
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.ns import qn
+from pptx.util import Pt
+from graphics.render import atomic_path
+from instrumentation.tracer import tracer
+
+R_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+def get_layout(prs, name):
+    for layout in prs.slide_layouts:
+        if layout.name == name:
+            return layout
+    return prs.slide_layouts[5]
+
+
+def save_presentation(prs, target):
+    # prs.save to a path (written atomically) or file-like object, traced with the slide count and bytes written
+    with tracer.span('pptx.save', slides=len(prs.slides)):
+        if isinstance(target, (str, os.PathLike)):
+            with atomic_path(target) as temp:
+                prs.save(temp)
+        else:
+            prs.save(target)
+    if tracer.enabled:
+        tracer.count('bytes.written', os.path.getsize(target) if isinstance(target, (str, os.PathLike))
+                     else target.tell())
+
+
+def clone_slide(source, prs, image_parts=None):
+    # Copy a slide's shapes (and the pictures they reference) into another presentation. Passing the same
+    # image_parts dict for every slide cloned into one deck relates repeated pictures to the part added first,
+    # instead of hashing and looking them up in the whole package each time
+    slide = prs.slides.add_slide(get_layout(prs, source.slide_layout.name))
+    tree = slide.shapes._spTree
+    for placeholder in list(slide.placeholders):
+        tree.remove(placeholder._element)
+
+    # Pictures are re-added to the target package so identical images are stored only once
+    rids = {}
+    for rid, rel in source.part.rels.items():
+        if rel.reltype == RT.IMAGE and image_parts is not None and rel.target_part in image_parts:
+            rids[rid] = slide.part.relate_to(image_parts[rel.target_part], RT.IMAGE)
+        elif rel.reltype == RT.IMAGE:
+            image_part, rids[rid] = slide.part.get_or_add_image_part(io.BytesIO(rel.target_part.blob))
+            if image_parts is not None:
+                image_parts[rel.target_part] = image_part
+        elif rel.is_external:
+            rids[rid] = slide.part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+
+    for shape in source.shapes:
+        element = copy.deepcopy(shape._element)
+        for node in element.iter():
+            for attribute, value in node.attrib.items():
+                if attribute.startswith(f'{{{R_NAMESPACE}}}') and value in rids:
+                    node.set(attribute, rids[value])
+        tree.insert_element_before(element, 'p:extLst')
+    return slide
+
+
+class SlideRegion:
+    # Maps data coordinates onto a rectangle of the slide (EMU), the way axes limits map data onto a figure
+    def __init__(self, left, top, width, height, xlim, ylim, invert_y=False):
+        self.left, self.top, self.width, self.height = int(left), int(top), int(width), int(height)
+        self.xlim = xlim
+        self.ylim = ylim
+        self.invert_y = invert_y
+
+    def x(self, value):
+        x0, x1 = self.xlim
+        return self.left + (value - x0) / (x1 - x0) * self.width
+
+    def y(self, value):
+        y0, y1 = self.ylim
+        fraction = (value - y0) / (y1 - y0)
+        return self.top + (fraction if self.invert_y else 1 - fraction) * self.height
+
+    def dx(self, length):
+        return abs(length / (self.xlim[1] - self.xlim[0]) * self.width)
+
+    def dy(self, length):
+        return abs(length / (self.ylim[1] - self.ylim[0]) * self.height)
+
+
+class ShapeBatch:
+    # Adds thousands of shapes to a slide in linear time. python-pptx scans every id on the slide for each new
+    # shape; here shapes are built on a small scratch slide and moved over in batches with ids from a counter.
+    # Only for shapes without relationships (auto shapes, freeforms, text boxes), not pictures
+    def __init__(self, slide, size=50):
+        self.slide = slide
+        self.size = size
+        scratch = Presentation()
+        self.scratch = scratch.slides.add_slide(get_layout(scratch, 'Blank'))
+        self.next_id = max(int(value) for value in slide.shapes._spTree.xpath('//p:cNvPr/@id')) + 1
+
+    @property
+    def shapes(self):
+        # Shape collection to add to; call flush() once everything is added
+        if len(self.scratch.shapes._spTree) >= self.size:
+            self.flush()
+        return self.scratch.shapes
+
+    def flush(self):
+        tree = self.slide.shapes._spTree
+        elements = list(self.scratch.shapes._spTree.iter_shape_elms())
+        tracer.count('shapes.created', len(elements))
+        for element in elements:
+            element.find(f'.//{qn("p:cNvPr")}').set('id', str(self.next_id))
+            self.next_id += 1
+            tree.insert_element_before(element, 'p:extLst')
+
+
+def rgb_color(color):
+    # Any matplotlib colour spec (name, hex, RGB tuple); matplotlib is only imported once shapes are coloured
+    from matplotlib.colors import to_rgb
+    return RGBColor(*(round(channel * 255) for channel in to_rgb(color)))
+
+
+def set_fill(shape, color, alpha=None):
+    # Solid fill from any matplotlib colour spec, optionally translucent
+    shape.fill.solid()
+    shape.fill.fore_color.rgb = rgb_color(color)
+    if alpha is not None:
+        srgb = shape.fill._xPr.find(qn('a:solidFill'))[0]
+        srgb.append(srgb.makeelement(qn('a:alpha'), {'val': str(int(alpha * 100000))}))
+
+
+def set_line(shape, color='black', width=1):
+    if color is None:
+        shape.line.fill.background()
+    else:
+        shape.line.color.rgb = rgb_color(color)
+        shape.line.width = Pt(width)
+
+
+def set_text(shape, text, size, color='black', bold=False, align=PP_ALIGN.CENTER, anchor=MSO_ANCHOR.MIDDLE,
+             wrap=False):
+    frame = shape.text_frame
+    frame.margin_left = frame.margin_right = frame.margin_top = frame.margin_bottom = 0
+    frame.word_wrap = wrap
+    frame.vertical_anchor = anchor
+    lines = str(text).split('\n')
+    for i, line in enumerate(lines):
+        paragraph = frame.paragraphs[0] if i == 0 else frame.add_paragraph()
+        paragraph.alignment = align
+        run = paragraph.add_run()
+        run.text = line
+        run.font.size = Pt(size)
+        run.font.bold = bold
+        run.font.color.rgb = rgb_color(color)
+    return frame
+
+
+def add_textbox(shapes, left, top, width, height, text, size, **kw):
+    box = shapes.add_textbox(int(left), int(top), int(width), int(height))
+    set_text(box, text, size, **kw)
+    return box
+
+
+def add_marker(shapes, shape, cx, cy, width, height):
+    # A right-pointing triangle, circle or square with its centre (for triangles: circumcentre) at cx, cy
+    if shape == 'triangle':
+        # Circumradius r: the triangle spans from cx - r / 2 to cx + r, like matplotlib's RegularPolygon
+        r = width / 1.5
+        builder = shapes.build_freeform(int(cx - r / 2), int(cy - height / 2), scale=1.0)
+        builder.add_line_segments([(int(cx + r), int(cy)), (int(cx - r / 2), int(cy + height / 2))])
+        marker = builder.convert_to_shape()
+    else:
+        kind = MSO_SHAPE.OVAL if shape == 'circle' else MSO_SHAPE.RECTANGLE
+        marker = shapes.add_shape(kind, int(cx - width / 2), int(cy - height / 2), int(width), int(height))
+    marker.shadow.inherit = False
+    return marker
+
+
+def add_polygon(shapes, rings):
+    # One freeform from closed rings of (x, y) slide points, e.g. the outlines and holes of a region
+    (x0, y0), *_ = rings[0]
+    builder = shapes.build_freeform(int(x0), int(y0), scale=1.0)
+    for i, ring in enumerate(rings):
+        if i:
+            builder.move_to(int(ring[0][0]), int(ring[0][1]))
+        builder.add_line_segments([(int(x), int(y)) for x, y in ring[1:]], close=True)
+    polygon = builder.convert_to_shape()
+    polygon.shadow.inherit = False
+    return polygon
+
+
+def add_puck(shapes, shape, cx, cy, width, height, color, number, font, shadow_offset=0):
+    # Native counterpart of graphics.puck.Puck: translucent shadow, outlined marker and a white number
+    if shadow_offset:
+        shadow = add_marker(shapes, shape, cx - shadow_offset, cy + shadow_offset, width, height)
+        set_fill(shadow, 'black', alpha=0.3)
+        set_line(shadow, None)
+    marker = add_marker(shapes, shape, cx, cy, width, height)
+    set_fill(marker, color)
+    set_line(marker)
+    set_text(marker, number, font, color='white', bold=True)
+    return marker
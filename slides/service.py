@@ -0,0 +1,232 @@
+import argparse
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from data.cache import cache_key
+from data.server import data_server
+from graphics.render import figure_to_buffer
+from instrumentation.tracer import tracer
+from slides.cua_slide.engagements_plotter import EngagementsPlotter, render_calendar_panel, render_map_panel
+from slides.cua_slide.map import MapPlotter
+from slides import fiscal
+from slides.ie_slide.ie_calendar import InformationEnvironmentGenerator
+
+PPTX_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+# Data version the datasets of this (worker) process were loaded at
+loaded_version = None
+
+
+def warm():
+    # Worker initializer: read every dataset, the basemap raster and the font cache before the first request
+    global loaded_version
+    loaded_version = data_server.data_version()
+    data_server.load('engagements', 'engagements90', 'bases')
+    MapPlotter.get_basemap().load()
+    fig, ax = plt.subplots()
+    ax.text(0, 0, 'warm', fontweight='bold')
+    figure_to_buffer(fig)
+
+
+def refresh(version):
+    # Re-read the datasets when their files changed since this worker loaded them
+    global loaded_version
+    if version != loaded_version:
+        data_server.reload()
+        loaded_version = version
+
+
+def select_window(params):
+    fiscal_week, fiscal_year = params.get('fiscal_week'), params.get('fiscal_year')
+    return fiscal.select_window(int(fiscal_week) if fiscal_week else None,
+                                int(fiscal_year) if fiscal_year else None, params.get('unit', '2ID/RUCD'))
+
+
+def render_calendar(params):
+    return render_calendar_panel(*select_window(params))[0]
+
+
+def render_map(params):
+    return render_map_panel(*select_window(params))[0]
+
+
+def render_ie(params):
+    generator = InformationEnvironmentGenerator()
+    if 'today' in params:
+        generator.today = datetime.strptime(params['today'], '%Y-%m-%d')
+    return generator.render().getvalue()
+
+
+def render_deck(params):
+    fiscal_week, engagements, start_date = select_window(params)
+    output = io.BytesIO()
+    plotter = EngagementsPlotter(ppt_output=output, fiscal_week=fiscal_week, unit=params.get('unit', '2ID/RUCD'),
+                                 engagements=engagements, start_date=start_date)
+    if params.get('native') in ('1', 'true', 'yes'):
+        plotter.create_native_ppt()
+    else:
+        plotter.render_all()
+    return output.getvalue()
+
+
+# Query parameters the endpoints accept, with the conversion each value must pass
+PARAMETERS = {
+    'fiscal_week': int,
+    'fiscal_year': int,
+    'unit': str,
+    'today': lambda value: datetime.strptime(value, '%Y-%m-%d'),
+    'native': str,
+}
+
+
+def check_params(params):
+    # Unknown or malformed query parameters are the client's error (400); anything raised while rendering is a
+    # server error (500)
+    for name, value in params.items():
+        if name not in PARAMETERS:
+            raise ValueError(f"unknown parameter '{name}' (accepted: {', '.join(PARAMETERS)})")
+        try:
+            PARAMETERS[name](value)
+        except ValueError:
+            raise ValueError(f'invalid {name} {value!r}') from None
+
+
+def resolve_params(path, params):
+    # Defaults that follow the date are resolved before the cache key is built, so a long-running service moves on
+    # to the new chart and title when the day, fiscal week or fiscal year changes. A calendar without a fiscal week
+    # shows every engagement but is still labelled from the current week
+    resolved = dict(params)
+    if path == '/ie.png':
+        resolved.setdefault('today', datetime.today().strftime('%Y-%m-%d'))
+    elif 'fiscal_week' in params:
+        resolved.setdefault('fiscal_year', str(fiscal.current_fiscal_year()))
+    else:
+        resolved['current_fiscal_week'] = str(fiscal.current_fiscal_week())
+    return resolved
+
+
+# Endpoint path -> (renderer, content type)
+ENDPOINTS = {
+    '/calendar.png': (render_calendar, 'image/png'),
+    '/map.png': (render_map, 'image/png'),
+    '/ie.png': (render_ie, 'image/png'),
+    '/deck.pptx': (render_deck, PPTX_TYPE),
+}
+
+
+def render(path, params, version):
+    # Worker entry point
+    refresh(version)
+    with tracer.span('service.render', path=path):
+        return ENDPOINTS[path][0](params)
+
+
+class RenderService:
+    # Renders in a bounded pool of warm worker processes (pyplot is not thread-safe, so renders never share a
+    # process) and keeps the most recent results, keyed by endpoint, resolved parameters and the data version.
+    # Concurrent requests for the same output wait on the same render
+    def __init__(self, workers=2, cache_size=64):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warm)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, params):
+        version = data_server.data_version()
+        params = resolve_params(path, params)
+        key = cache_key(path, sorted(params.items()), version)
+        with self.lock:
+            future = self.cache.get(key)
+            if future is None:
+                future = self.pool.submit(render, path, params, version)
+                self.cache[key] = future
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            self.cache.move_to_end(key)
+        try:
+            return future.result(), key
+        except Exception:
+            with self.lock:
+                self.cache.pop(key, None)  # never cache failures
+            raise
+
+    def warm_up(self):
+        # Start every worker now instead of on the first requests
+        for future in [self.pool.submit(int) for _ in range(self.workers)]:
+            future.result()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            return self.respond(200, b'ok', 'text/plain')
+        if url.path not in ENDPOINTS:
+            return self.respond(404, f'Unknown endpoint. Available: {", ".join(ENDPOINTS)}'.encode(), 'text/plain')
+
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            check_params(params)
+        except ValueError as error:
+            return self.respond(400, f'Bad request: {error}'.encode(), 'text/plain')
+        try:
+            body, etag = self.service.get(url.path, params)
+        except Exception as error:
+            return self.respond(500, f'Render failed: {error}'.encode(), 'text/plain')
+
+        if self.headers.get('If-None-Match') == f'"{etag}"':
+            return self.respond(304, b'', None, etag)
+        self.respond(200, body, ENDPOINTS[url.path][1], etag)
+
+    def respond(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        if etag:
+            self.send_header('ETag', f'"{etag}"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host='127.0.0.1', port=8765, workers=2, cache_size=64):
+    warm()  # workers fork from a process that already holds the datasets and the basemap
+    service = RenderService(workers, cache_size)
+    service.warm_up()
+    RenderHandler.service = service
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    print(f'Serving {", ".join(ENDPOINTS)} on http://{host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve calendar, map, IE chart and deck renders over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='render processes')
+    parser.add_argument('--cache-size', type=int, default=64, help='rendered outputs kept in memory')
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.cache_size)
+
+
+if __name__ == '__main__':
+    main()
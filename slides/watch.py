@@ -0,0 +1,101 @@
+import argparse
+import logging
+import time
+from data.cache import source_mtime
+from data.server import Server, data_server
+from slides.build import BUILDERS, build_all, dependents
+
+logger = logging.getLogger('engagements.watch')
+
+
+class DataWatcher:
+    # Polls the data files the builders read and rebuilds once a burst of saves has settled: only the changed
+    # datasets are re-read into the shared server and only the artifacts depending on them are re-rendered
+    def __init__(self, names=None, interval=0.5, debounce=1.0, manifest_path='build_manifest.json'):
+        self.names = names or sorted({name for _, reads in BUILDERS.values() for name in reads})
+        self.interval = interval
+        self.debounce = debounce
+        self.manifest_path = manifest_path
+        self.mtimes = self.snapshot()
+
+    def snapshot(self):
+        # A file that is missing mid-save (editors often write by rename) reads as None until it reappears
+        mtimes = {}
+        for name in self.names:
+            try:
+                mtimes[name] = source_mtime(Server.get_relative_path(Server.get_dataset(name).filename))
+            except OSError:
+                mtimes[name] = None
+        return mtimes
+
+    def changes(self):
+        current = self.snapshot()
+        changed = {name for name in self.names if current[name] != self.mtimes[name] and current[name] is not None}
+        self.mtimes = current
+        return changed
+
+    def wait_for_changes(self):
+        # Blocks until some files changed and then stayed unchanged for `debounce` seconds
+        changed = set()
+        quiet_since = None
+        while True:
+            time.sleep(self.interval)
+            new = self.changes()
+            if new:
+                changed |= new
+                quiet_since = time.monotonic()
+            elif changed and time.monotonic() - quiet_since >= self.debounce:
+                return changed
+
+    def rebuild(self, names):
+        loaded = [name for name in names if data_server.is_loaded(name)]
+        if loaded:
+            data_server.reload(*loaded)
+        store = data_server.get_store()
+        for name in set(names) & store.imported():
+            store.import_csv(name)
+        return build_all(self.manifest_path, only=dependents(names))
+
+    def run(self, initial_build=True):
+        if initial_build:
+            self.attempt(build_all, self.manifest_path)
+        logger.info('Watching %s', ', '.join(self.names))
+        while True:
+            names = self.wait_for_changes()
+            logger.info('Changed: %s', ', '.join(sorted(names)))
+            self.attempt(self.rebuild, names)
+
+    @staticmethod
+    def attempt(build, *args):
+        # A half-edited file must not stop the watcher; the next save triggers another attempt
+        try:
+            artifacts = build(*args)
+        except Exception:
+            logger.exception('Build failed; waiting for the next change')
+            return
+        for artifact in artifacts:
+            logger.info('Wrote %s', artifact)
+        if not artifacts:
+            logger.info('Everything up to date')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild the slides whenever the engagement data changes.')
+    parser.add_argument('--dataset', action='append', choices=Server.dataset_names(),
+                        help='only watch these datasets; may be repeated')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between polls')
+    parser.add_argument('--debounce', type=float, default=1.0, help='seconds without changes before rebuilding')
+    parser.add_argument('--manifest', default='build_manifest.json')
+    parser.add_argument('--no-initial-build', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s', datefmt='%H:%M:%S')
+    watcher = DataWatcher(args.dataset, args.interval, args.debounce, args.manifest)
+    try:
+        watcher.run(not args.no_initial_build)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
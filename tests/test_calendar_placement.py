@@ -0,0 +1,44 @@
+import pandas as pd
+from slides.cua_slide.engagement_calendar import CalendarPlotter
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+def baseline_placement(engagements, start_date):
+    # The row-by-row placement CalendarPlotter.plot_engagements used before it was vectorised
+    cells = {}
+    for _, row in engagements.iterrows():
+        week_index = (row['date'] - start_date).days // 7
+        day = {'Saturday': 'Friday', 'Sunday': 'Monday'}.get(row['date'].day_name(), row['date'].day_name())
+        if week_index < 4:
+            cells.setdefault((week_index, DAYS.index(day)), []).append(row)
+
+    counters = {}
+    placed = []
+    for (week_index, day_index), rows in cells.items():
+        for slot, row in enumerate(rows):
+            counters[row['category']] = counters.get(row['category'], 0) + 1
+            placed.append((day_index * 10 + 1, week_index * 10 + 3 + 2 * slot, row['category'],
+                           counters[row['category']], row['engagement']))
+    return placed
+
+
+def test_place_engagements_matches_baseline():
+    # Out of order dates, weekends, several rows per cell and rows past the four weeks
+    dates = ['2024-03-06', '2024-03-04', '2024-03-09', '2024-03-06', '2024-03-10', '2024-03-20', '2024-03-06',
+             '2024-03-29', '2024-04-02', '2024-05-01', '2024-03-11']
+    categories = ['Mil-Mil (US)', 'Civ-Mil', 'Mil-Mil (ROK)', 'Civ-Mil', 'Mil-Mil (US)', 'Mil-Mil (US)',
+                  'Mil-Mil (ROK)', 'Civ-Mil', 'Mil-Mil (US)', 'Civ-Mil', 'Mil-Mil (ROK)']
+    engagements = pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'category': pd.Categorical(categories),
+        'color': 'blue',
+        'engagement': [f'Engagement {i}' for i in range(len(dates))],
+    })
+    plotter = CalendarPlotter(0, engagements=engagements)
+    placement = plotter.place_engagements()
+
+    expected = baseline_placement(engagements, plotter.get_start_date())
+    actual = list(zip(placement['x'], placement['y'], placement['category'], placement['number'],
+                      placement['engagement']))
+    assert actual == expected
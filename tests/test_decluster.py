@@ -0,0 +1,44 @@
+import numpy as np
+from slides.cua_slide.decluster import Declusterer
+
+
+def min_distance(pucks):
+    points = pucks[['x', 'y']].to_numpy()
+    distances = np.hypot(*(points[:, None, :] - points[None, :, :]).transpose(2, 0, 1))
+    return distances[~np.eye(len(points), dtype=bool)].min()
+
+
+def test_nearby_points_cluster_and_distant_ones_do_not():
+    x = np.array([127.00, 127.05, 127.10, 129.0])
+    y = np.array([37.50, 37.52, 37.49, 35.0])
+    clusters = Declusterer().cluster(x, y)
+    assert clusters[0] == clusters[1] == clusters[2]
+    assert clusters[3] != clusters[0]
+
+
+def test_stacked_points_are_spread_without_overlaps():
+    # Five engagements at each of three bases, two of them close together
+    x = np.repeat([127.0, 127.1, 128.5], 5)
+    y = np.repeat([37.5, 37.5, 36.0], 5)
+    declusterer = Declusterer()
+    pucks, badges = declusterer.place(x, y)
+
+    assert badges.empty
+    assert sorted(pucks.index) == list(range(15))
+    assert min_distance(pucks) >= declusterer.spacing * 0.999
+    # Every puck stays near its own base
+    assert (np.hypot(pucks['x'] - x[pucks.index], pucks['y'] - y[pucks.index]) < 1).all()
+
+
+def test_crowded_spot_collapses_into_a_badge():
+    x = np.concatenate([np.full(20, 127.0), [129.0]])
+    y = np.concatenate([np.full(20, 37.5), [35.0]])
+    pucks, badges = Declusterer(badge_threshold=12).place(x, y)
+    assert badges['count'].tolist() == [20]
+    assert pucks.index.tolist() == [20]
+    assert (pucks['x'].iloc[0], pucks['y'].iloc[0]) == (129.0, 35.0)
+
+
+def test_no_points():
+    pucks, badges = Declusterer().place([], [])
+    assert pucks.empty and badges.empty
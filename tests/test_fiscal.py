@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+import pandas as pd
+from slides.fiscal import current_fiscal_week, current_fiscal_year, fiscal_week_start, select_window
+
+
+def test_fiscal_year_starts_in_october():
+    assert current_fiscal_year(datetime(2023, 9, 30)) == 2023
+    assert current_fiscal_year(datetime(2023, 10, 1)) == 2024
+    assert current_fiscal_year(datetime(2024, 3, 1)) == 2024
+
+
+def test_fiscal_week_counts_from_the_first_of_october():
+    assert current_fiscal_week(datetime(2023, 10, 1)) == 1
+    assert current_fiscal_week(datetime(2023, 10, 8)) == 2
+    assert current_fiscal_week(datetime(2024, 3, 1)) == 22
+
+
+def test_fiscal_week_start_is_the_monday_of_that_week():
+    # 1 October 2023 is a Sunday
+    assert fiscal_week_start(1, 2024) == pd.Timestamp('2023-09-25')
+    assert fiscal_week_start(22, 2024) == pd.Timestamp('2024-02-19')
+    assert fiscal_week_start(2, 2025) == pd.Timestamp('2024-10-07')  # 1 October 2024 is a Tuesday
+    for week in range(1, 53):
+        assert fiscal_week_start(week, 2024).weekday() == 0
+
+
+def test_select_window_returns_four_weeks_of_engagements():
+    fiscal_week, engagements, start_date = select_window(22, 2024)
+    assert (fiscal_week, start_date) == (22, pd.Timestamp('2024-02-19'))
+    assert len(engagements) > 0
+    assert engagements['date'].min() >= start_date
+    assert engagements['date'].max() < start_date + timedelta(weeks=4)
+
+
+def test_select_window_without_a_week_shows_everything():
+    fiscal_week, engagements, start_date = select_window()
+    assert fiscal_week == current_fiscal_week()
+    assert engagements is None and start_date is None
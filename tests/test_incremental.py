@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+from slides import build
+from slides.concept_slide.concept_slide_generator import ConceptSlideGenerator
+from slides.incremental import BuildManifest
+
+ROWS = pd.DataFrame({'date': pd.to_datetime(['2024-03-01', '2024-03-05']), 'engagement': ['Meeting', 'Briefing']})
+
+
+def test_fingerprint_follows_rows_and_parameters():
+    fingerprint = BuildManifest.fingerprint(ROWS, fiscal_week=30)
+    assert BuildManifest.fingerprint(ROWS.copy(), fiscal_week=30) == fingerprint
+    assert BuildManifest.fingerprint(ROWS, fiscal_week=31) != fingerprint
+    assert BuildManifest.fingerprint(ROWS.assign(engagement=['Meeting', 'Review']), fiscal_week=30) != fingerprint
+    assert BuildManifest.fingerprint(ROWS.rename(columns={'engagement': 'title'}), fiscal_week=30) != fingerprint
+
+
+def test_fingerprint_ignores_the_index():
+    # A window sliced out of a larger frame keeps its original row labels
+    assert BuildManifest.fingerprint(ROWS.set_axis([7, 9])) == BuildManifest.fingerprint(ROWS)
+
+
+def test_row_fingerprints_only_change_for_edited_rows():
+    before = BuildManifest.row_fingerprints(ROWS, image='img.png')
+    after = BuildManifest.row_fingerprints(ROWS.assign(engagement=['Meeting', 'Review']), image='img.png')
+    assert before[0] == after[0]
+    assert before[1] != after[1]
+
+
+def test_artifact_is_fresh_until_its_inputs_or_file_change(tmp_path):
+    artifact = tmp_path / 'calendar.png'
+    manifest_path = tmp_path / 'manifest.json'
+    manifest = BuildManifest(str(manifest_path))
+    fingerprint = BuildManifest.fingerprint(ROWS)
+
+    manifest.record(str(artifact), fingerprint)
+    assert not manifest.is_fresh(str(artifact), fingerprint)  # recorded, but never written
+    artifact.write_bytes(b'png')
+    assert manifest.is_fresh(str(artifact), fingerprint)
+    assert not manifest.is_fresh(str(artifact), BuildManifest.fingerprint(ROWS, fiscal_week=31))
+
+    manifest.save()
+    assert BuildManifest(str(manifest_path)).is_fresh(str(artifact), fingerprint)
+
+
+class Recorded:
+    def build(self, manifest):
+        manifest.record('calendar.png', 'fingerprint')
+        return ['calendar.png']
+
+
+class Failing:
+    def build(self, manifest):
+        raise RuntimeError('render failed')
+
+
+def test_manifest_keeps_builds_before_a_failing_builder(tmp_path, monkeypatch):
+    monkeypatch.setattr(build, 'BUILDERS', {'engagements': (Recorded, ()), 'ie': (Failing, ())})
+    manifest_path = tmp_path / 'manifest.json'
+    with pytest.raises(RuntimeError):
+        build.build_all(str(manifest_path))
+    assert BuildManifest(str(manifest_path)).entries == {'calendar.png': 'fingerprint'}
+
+
+def test_concept_deck_is_skipped_without_its_image(tmp_path):
+    generator = ConceptSlideGenerator(output_ppt=str(tmp_path / 'concept.pptx'), image=str(tmp_path / 'img.png'))
+    manifest = BuildManifest(str(tmp_path / 'manifest.json'))
+    with pytest.warns(UserWarning, match='img.png is missing'):
+        assert generator.build(manifest) == []
+    assert manifest.entries == {}
@@ -0,0 +1,46 @@
+import numpy as np
+from slides.ie_slide.layout import LaneLayout
+
+BANDS = {'Civilian': (0, 16), 'Military': (16, 25)}  # 5 and 3 lanes of height 3
+
+
+def overlapping(starts, ends, lanes, category_mask):
+    # Pairs of items in the same lane whose intervals overlap
+    index = np.flatnonzero(category_mask)
+    return [(i, j) for i in index for j in index
+            if i < j and lanes[i] == lanes[j] and starts[i] < ends[j] and starts[j] < ends[i]]
+
+
+def test_items_in_a_lane_never_overlap():
+    rng = np.random.default_rng(0)
+    starts = rng.uniform(0, 90, 40)
+    ends = starts + rng.uniform(1, 6, 40)
+    categories = np.where(np.arange(40) % 2, 'Civilian', 'Military')
+    placement = LaneLayout(BANDS).assign(categories, starts, ends)
+
+    for category in BANDS:
+        fitted = (categories == category) & ~placement['overflow'].to_numpy()
+        assert overlapping(starts, ends, placement['lane'].to_numpy(), fitted) == []
+
+
+def test_lowest_free_lane_and_y_position():
+    # The second item overlaps the first, the third starts once the first has ended
+    placement = LaneLayout(BANDS).assign(['Civilian'] * 3, [0, 1, 5], [4, 6, 8])
+    assert placement['lane'].tolist() == [0, 1, 0]
+    assert placement['y'].tolist() == [14.5, 11.5, 14.5]  # from the top of the band, 1.5 margin, 3 per lane
+    assert not placement['overflow'].any()
+
+
+def test_overflow_when_every_lane_is_busy():
+    # Military has three lanes; four simultaneous items overflow once
+    placement = LaneLayout(BANDS).assign(['Military'] * 4, [0, 0, 0, 0], [5, 5, 5, 5])
+    assert sorted(placement['lane'][:3]) == [0, 1, 2]
+    assert placement['overflow'].tolist() == [False, False, False, True]
+
+
+def test_result_is_aligned_with_the_inputs():
+    categories = ['Military', 'Civilian', 'Military']
+    placement = LaneLayout(BANDS).assign(categories, [0, 0, 10], [5, 5, 12])
+    assert placement['category'].tolist() == categories
+    assert placement['lane'].tolist() == [0, 0, 0]
+    assert placement['y'].tolist() == [23.5, 14.5, 23.5]
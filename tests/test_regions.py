@@ -0,0 +1,100 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from matplotlib.figure import Figure
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.util import Inches
+from data.geometry import GeometryProvider
+from data.regions import RegionIndex
+from slides.cua_slide.map import MapPlotter
+
+
+def grid(x0=126, x1=128, y0=36, y1=38):
+    # One degree boxes standing in for provinces
+    boxes = [shapely.box(x, y, x + 1, y + 1) for x in range(x0, x1) for y in range(y0, y1)]
+    return gpd.GeoDataFrame({'adm1_code': [f'R{i}' for i in range(len(boxes))]}, geometry=boxes, crs='EPSG:4326')
+
+
+class GridRegions(GeometryProvider):
+    def available(self):
+        return True
+
+    def load(self, extent, codes=None, tolerance=None):
+        return grid()
+
+
+def test_locate_points_in_regions():
+    # R0: 126-127 E 36-37 N, R1: 126-127 E 37-38 N, R2: 127-128 E 36-37 N, R3: 127-128 E 37-38 N
+    index = RegionIndex(grid())
+    ids = index.locate([126.5, 127.5, 127.5, 130.0, np.nan], [36.5, 37.5, 36.2, 36.5, 36.5])
+    assert ids.tolist() == [0, 3, 2, -1, -1]
+
+
+def test_point_on_a_shared_border_belongs_to_the_first_region():
+    assert RegionIndex(grid()).locate([127.0], [36.5]).tolist() == [0]
+
+
+def test_count_per_region_and_category():
+    index = RegionIndex(grid())
+    categories = pd.Series(['Civ-Mil', 'Mil-Mil (US)', 'Civ-Mil', 'Civ-Mil'],
+                           dtype=pd.CategoricalDtype(['Mil-Mil (US)', 'Mil-Mil (ROK)', 'Civ-Mil']))
+    counts = index.count(np.array([0, 0, 3, -1]), categories)
+    assert list(counts.columns) == ['Mil-Mil (US)', 'Mil-Mil (ROK)', 'Civ-Mil', 'total']
+    assert counts['total'].tolist() == [2, 0, 0, 1]
+    assert counts.loc[0].tolist() == [1, 0, 1, 2]
+
+
+ENGAGEMENTS = pd.DataFrame({
+    # Camp Humphreys and K16 lie inside the grid; Rodriguez (38.25 N) is north of it; Nowhere is unknown
+    'location': pd.Categorical(['Camp Humphreys', 'K16 Airbase', 'Rodriguez Live Fire Complex', 'Nowhere']),
+    'category': pd.Categorical(['Mil-Mil (US)', 'Civ-Mil', 'Mil-Mil (US)', 'Mil-Mil (ROK)']),
+})
+
+
+def test_legend_counts_match_the_shaded_regions(monkeypatch):
+    monkeypatch.setattr(MapPlotter, 'regions', GridRegions())
+    plotter = MapPlotter(engagements=ENGAGEMENTS)
+    summary = plotter.aggregate_regions()
+    assert summary['total'].sum() == 2
+    assert plotter.category_counters == {'Mil-Mil (US)': 1, 'Mil-Mil (ROK)': 0, 'Civ-Mil': 1}
+
+
+def test_shading_keeps_the_map_aspect(monkeypatch):
+    monkeypatch.setattr(MapPlotter, 'regions', GridRegions())
+    plotter = MapPlotter(engagements=ENGAGEMENTS)
+    ax = Figure().add_subplot()
+    ax.set_aspect(2)
+    plotter.plot_regions(ax, plotter.aggregate_regions())
+    assert ax.get_aspect() == 2
+
+
+def test_native_map_shades_the_regions(tmp_path, monkeypatch):
+    # A blank raster in place of the cached basemap, which is rendered from downloaded geometry
+    basemap = MapPlotter.get_basemap()
+    Figure(figsize=MapPlotter.figsize, dpi=10).savefig(tmp_path / 'basemap.png')
+    basemap.path, basemap.image = str(tmp_path / 'basemap.png'), np.zeros((120, 100, 4))
+    basemap.layout = {'xlim': MapPlotter.extent[:2], 'ylim': MapPlotter.extent[2:]}
+    monkeypatch.setattr(basemap, 'load', lambda: None)
+    monkeypatch.setattr(MapPlotter, 'get_basemap', classmethod(lambda cls, dpi=None: basemap))
+    monkeypatch.setattr(MapPlotter, 'regions', GridRegions())
+
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    MapPlotter(engagements=ENGAGEMENTS).draw_pptx(slide, 0, 0, Inches(5), Inches(6), mode='regions')
+    shapes = list(slide.shapes)
+    # Camp Humphreys' and K16's regions, outlined and labelled with their total; the legend triangle is a
+    # freeform too
+    assert sum(shape.shape_type == MSO_SHAPE_TYPE.FREEFORM for shape in shapes) == 3
+    assert [shape.text_frame.text for shape in shapes if shape.has_text_frame].count('1') == 4
+    with pytest.raises(ValueError, match="Unknown map mode 'heat'"):
+        MapPlotter(engagements=ENGAGEMENTS).draw_pptx(slide, 0, 0, Inches(5), Inches(6), mode='heat')
+
+
+def test_missing_region_layer_is_reported(monkeypatch):
+    monkeypatch.setattr(MapPlotter, 'regions', GeometryProvider('10m_cultural/ne_10m_missing_layer.shp'))
+    plotter = MapPlotter(engagements=pd.DataFrame({'location': ['Camp Humphreys'], 'category': ['Civ-Mil']}))
+    with pytest.raises(FileNotFoundError, match='ne_10m_missing_layer.shp'):
+        plotter.aggregate_regions()
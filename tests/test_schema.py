@@ -0,0 +1,73 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from data.schema import BaseIndex, SchemaError, apply_schema
+from data.store import EngagementStore
+
+ENGAGEMENTS = """date,location,engagement,category,loe,color
+2024-03-01,Camp Humphreys,Meeting,Mil-Mil (US),LOE 1,blue
+2024-03-05,Camp Casey,Inspection,Civ-Mil,LOE 2,green
+2024-03-06,Camp Humphreys,Briefing,Mil-Mil (ROK),LOE 1,blue
+"""
+
+
+def read(text):
+    return pd.read_csv(io.StringIO(text))
+
+
+def test_columns_are_typed():
+    frame = apply_schema('engagements', read(ENGAGEMENTS))
+    assert frame['date'].dtype == 'datetime64[ns]'
+    assert isinstance(frame['category'].dtype, pd.CategoricalDtype)
+    assert list(frame['category'].cat.categories) == ['Mil-Mil (US)', 'Mil-Mil (ROK)', 'Civ-Mil']
+    assert isinstance(frame['location'].dtype, pd.CategoricalDtype)
+    assert frame['engagement'].tolist() == ['Meeting', 'Inspection', 'Briefing']
+
+
+def test_status_codes_become_small_integers():
+    frame = read('date,location,category,type,engagement,status\n'
+                 '2024-06-03,Seoul,Military,Civ-Mil,Exercise,2\n')
+    assert apply_schema('engagements90', frame)['status'].dtype == np.int8
+
+
+def test_unknown_category_names_the_csv_line():
+    text = ENGAGEMENTS.replace('Civ-Mil,LOE 2', 'Civil,LOE 2')
+    with pytest.raises(SchemaError, match=r"column 'category' has values outside .*'Civil' \(line 3\)"):
+        apply_schema('engagements', read(text))
+
+
+def test_unreadable_date_names_the_csv_line():
+    with pytest.raises(SchemaError, match=r"column 'date' has missing or unreadable dates \(line 4\)"):
+        apply_schema('engagements', read(ENGAGEMENTS.replace('2024-03-06', 'someday')))
+
+
+def test_missing_column():
+    with pytest.raises(SchemaError, match="column 'color' is missing"):
+        apply_schema('engagements', read(ENGAGEMENTS).drop(columns='color'))
+
+
+def test_datasets_without_schema_are_unchanged():
+    frame = read(ENGAGEMENTS)
+    assert apply_schema('sample_engagements', frame) is frame
+
+
+def test_store_errors_name_the_csv_line(tmp_path):
+    # Store windows are renumbered from 0, but errors still point at the imported CSV line
+    store = EngagementStore(str(tmp_path / 'engagements.db'))
+    store.import_csv('engagements')
+    with store.connect() as connection:
+        connection.execute("UPDATE engagements SET category = 'Civil' WHERE rowid = 7")
+    with pytest.raises(SchemaError, match=r'\(line 8\)'):
+        store.query('engagements', start='2024-03-10')
+
+
+def test_base_index_resolves_locations_to_coordinates():
+    bases = pd.DataFrame({'name': ['Camp Humphreys', 'Camp Casey'], 'latitude': [36.96, 37.91],
+                          'longitude': [127.03, 127.06]})
+    index = BaseIndex(bases)
+    ids = index.resolve(pd.Series(['Camp Casey', 'Nowhere', 'Camp Humphreys', None]))
+    assert ids.tolist() == [1, -1, 0, -1]
+    longitude, latitude = index.lookup(ids)
+    assert longitude[[0, 2]].tolist() == [127.06, 127.03]
+    assert np.isnan(latitude[[1, 3]]).all()
@@ -0,0 +1,16 @@
+from datetime import datetime
+from slides import fiscal
+from slides.service import resolve_params
+
+
+def test_ie_chart_is_keyed_on_the_day_it_shows():
+    assert resolve_params('/ie.png', {})['today'] == datetime.today().strftime('%Y-%m-%d')
+    assert resolve_params('/ie.png', {'today': '2024-06-01'}) == {'today': '2024-06-01'}
+
+
+def test_calendar_is_keyed_on_the_fiscal_week_and_year_it_shows(monkeypatch):
+    monkeypatch.setattr(fiscal, 'current_fiscal_week', lambda: 30)
+    monkeypatch.setattr(fiscal, 'current_fiscal_year', lambda: 2024)
+    assert resolve_params('/calendar.png', {}) == {'current_fiscal_week': '30'}
+    assert resolve_params('/deck.pptx', {'fiscal_week': '12'}) == {'fiscal_week': '12', 'fiscal_year': '2024'}
+    assert resolve_params('/map.png', {'fiscal_week': '12', 'fiscal_year': '2023'})['fiscal_year'] == '2023'
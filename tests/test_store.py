@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from data.server import Server
+from data.store import EngagementStore
+from slides.incremental import BuildManifest
+
+START, END = pd.Timestamp('2024-03-04'), pd.Timestamp('2024-04-01')
+
+
+@pytest.fixture
+def store(tmp_path):
+    # A store built from the bundled CSVs, outside the repository
+    store = EngagementStore(str(tmp_path / 'engagements.db'))
+    store.import_csv('engagements')
+    return store
+
+
+def in_memory_window(unit=None, start=START, end=END):
+    # The same window filtered from the full frame, as Server does without a store
+    return Server().filter_window('engagements', start, end, unit)
+
+
+def test_window_matches_the_in_memory_filter(store):
+    pd.testing.assert_frame_equal(store.query('engagements', START, END), in_memory_window())
+
+
+def test_window_keeps_the_categories_of_the_whole_file(store):
+    # A one-day window holds only some locations, but its dtypes (and so its build fingerprint) match the
+    # in-memory filter, which keeps the categories of the full frame
+    start, end = pd.Timestamp('2024-03-05'), pd.Timestamp('2024-03-06')
+    window = store.query('engagements', start, end)
+    assert window['location'].nunique() < len(window['location'].cat.categories)
+    pd.testing.assert_frame_equal(window, in_memory_window(start=start, end=end))
+    assert BuildManifest.fingerprint(window) == BuildManifest.fingerprint(in_memory_window(start=start, end=end))
+
+
+def test_unit_is_ignored_without_a_unit_column(store):
+    # The bundled engagements have no unit column; asking for a unit must not fail the query
+    pd.testing.assert_frame_equal(store.query('engagements', START, END, '2ID/RUCD'), in_memory_window('2ID/RUCD'))
+
+
+def test_unit_filters_when_the_table_has_a_unit_column(store):
+    with store.connect() as connection:
+        connection.execute("ALTER TABLE engagements ADD COLUMN unit TEXT DEFAULT '2ID/RUCD'")
+        connection.execute("UPDATE engagements SET unit = '8A' WHERE rowid % 2 = 0")
+    window = store.query('engagements', START, END, '8A')
+    assert len(window) > 0
+    assert set(window['unit']) == {'8A'}
+    assert len(window) + len(store.query('engagements', START, END, '2ID/RUCD')) == len(in_memory_window())
+
+
+def test_bounds_are_optional(store):
+    everything = store.query('engagements')
+    assert len(everything) == len(Server().load('engagements'))
+    assert (store.query('engagements', start=START)['date'] >= START).all()
+    assert (store.query('engagements', end=END)['date'] < END).all()
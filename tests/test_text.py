@@ -0,0 +1,58 @@
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from graphics.text import ELLIPSIS, TextLayout
+
+SENTENCE = 'Key leader engagement with the division commander at Camp Humphreys'
+
+
+@pytest.fixture
+def layout():
+    return TextLayout(8)
+
+
+def test_width_matches_matplotlib(layout):
+    fig = Figure(dpi=72)
+    text = fig.text(0, 0, 'Meeting at Camp Humphreys', fontsize=8)
+    rendered = text.get_window_extent(FigureCanvasAgg(fig).get_renderer()).width
+    assert layout.width('Meeting at Camp Humphreys') == pytest.approx(rendered, abs=1)
+
+
+def test_width_scales_with_size_and_takes_the_widest_line(layout):
+    assert TextLayout(16).width('Briefing') == pytest.approx(2 * layout.width('Briefing'))
+    assert layout.width('Briefing\nat Camp Casey') == layout.width('at Camp Casey')
+    assert layout.widths(['a', 'ab']).tolist() == [layout.width('a'), layout.width('ab')]
+
+
+def test_wrap_keeps_every_line_within_the_width(layout):
+    wrapped = layout.wrap(SENTENCE, 70)
+    lines = wrapped.split('\n')
+    assert len(lines) > 1
+    assert all(layout.width(line) <= 70 for line in lines)
+    assert ' '.join(lines) == SENTENCE
+
+
+def test_wrap_splits_words_wider_than_a_line(layout):
+    lines = layout.wrap('Supercalifragilisticexpialidocious', 40).split('\n')
+    assert len(lines) > 1
+    assert all(layout.width(line) <= 40 for line in lines)
+    assert ''.join(lines) == 'Supercalifragilisticexpialidocious'
+
+
+def test_wrap_cuts_at_max_lines_with_an_ellipsis(layout):
+    lines = layout.wrap(SENTENCE, 70, max_lines=2).split('\n')
+    assert len(lines) == 2
+    assert lines[-1].endswith(ELLIPSIS)
+    assert all(layout.width(line) <= 70 for line in lines)
+    assert layout.wrap('Briefing', 70, max_lines=2) == 'Briefing'
+
+
+def test_truncate(layout):
+    assert layout.truncate('Briefing', 100) == 'Briefing'
+    truncated = layout.truncate(SENTENCE, 60)
+    assert truncated.endswith(ELLIPSIS)
+    assert SENTENCE.startswith(truncated[:-1])
+    assert layout.width(truncated) <= 60
+    # The longest prefix that fits: one more character would not
+    longer = SENTENCE[:len(truncated)].rstrip() + ELLIPSIS
+    assert layout.width(longer) > 60